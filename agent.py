@@ -1,11 +1,32 @@
 import re
 import random
-from mcp.client import send_mcp_request, MCPMethod
+from mcp.client import send_mcp_request, stream_mcp_search
+from mcp.protocol import MCPMethod
 
 def parse_number(input_str):
     match = re.search(r'\d+', input_str)
     return int(match.group()) if match else None
 
+def formatar_numero(numero):
+    # 1204 -> "1.204"
+    return f"{numero:,}".replace(",", ".")
+
+def mostrar_similares(vendido):
+    # vizinhos mais próximos em preço, ano, km, motor, categoria, combustível e câmbio (similar_vehicles)
+    resposta = send_mcp_request(MCPMethod.SIMILAR_VEHICLES, {
+        "id": vendido['id'], "k": 5,
+        "fields": ['id', 'marca', 'modelo', 'ano', 'quilometragem', 'tp_transmissao', 'tp_combustivel', 'preco'],
+    })
+    similares = (resposta.get("result") or {}).get("results")
+    if not similares:
+        print("😕 Não achei nenhum disponível parecido com esse.\n")
+        return
+    print(f"\n✨ Parecidos com o {vendido['marca']} {vendido['modelo']} ({vendido['ano']}) e disponíveis:")
+    for v in similares:
+        print(f"  • {v['marca']} {v['modelo']} ({v['ano']}) | 📊 {v['quilometragem']:,} km | "
+              f"{v['tp_transmissao']} | {v['tp_combustivel']} | 💰 R$ {v['preco']:,.2f}")
+    print()
+
 def virtual_agent():
     while True:
         saudacoes = [
@@ -25,9 +46,13 @@ def virtual_agent():
             "Boa! Qual marca te chama mais atenção? Fiat, Chevrolet, Hyundai etc...",
             "Me conta das marcas que você gosta mais."
         ]
+        # contagens prontas no servidor (list_filters): mostra as marcas com mais carros
+        estoque = send_mcp_request(MCPMethod.LIST_FILTERS, {}).get("result")
+        if estoque and estoque["marcas"]:
+            marcas = ", ".join(f"{m['value']} ({formatar_numero(m['count'])})" for m in estoque["marcas"][:5])
+            print(f"🚗 Temos {formatar_numero(estoque['total'])} carros. As marcas com mais opções: {marcas}\n")
         marca = input(f"{random.choice(respostas_marca)} ").strip()
         if marca:
-            filtros['marca'] = marca
             print(f"Marca Selecionada: {marca}!\n")
 
         if marca:
@@ -43,9 +68,14 @@ def virtual_agent():
             ]
         modelo = input(f"{random.choice(respostas_modelo)} ").strip()
         if modelo:
-            filtros['modelo'] = modelo
             print(f"💡 {modelo} é um bom carro!\n")
 
+        # marca e modelo vão como texto livre: o servidor tolera erro de digitação ("corola"),
+        # apelidos ("vw", "camionete") e traz primeiro os carros mais parecidos com o que foi digitado
+        texto = f"{marca} {modelo}".strip()
+        if texto:
+            filtros['text'] = texto
+
         respostas_ano = [
             "E sobre o ano? Algum ano para poder dizer?",
             "Sobre o ano do carro, você tem preferência? Pode ser uma faixa ou ano específico",
@@ -120,6 +150,23 @@ def virtual_agent():
                     filtros['preco_max'] = preco
                     print(f"Show! Até R$ {preco:,}\n")
 
+        # ordem da lista: sem resposta, os mais parecidos (com texto) ou os mais baratos
+        ordens = {
+            'barato': ('preco', 'asc', "mais baratos"),
+            'caro': ('preco', 'desc', "mais caros"),
+            'novo': ('ano', 'desc', "mais novos"),
+            'rodado': ('quilometragem', 'asc', "menos rodados"),
+            'km': ('quilometragem', 'asc', "menos rodados"),
+        }
+        ordem_input = input("Prefere ver primeiro os mais baratos, os mais novos ou os menos rodados? ").strip().lower()
+        ordem = "mais parecidos com o que você pediu" if texto else "mais baratos"
+        for chave, (sort_by, order, descricao) in ordens.items():
+            if chave in ordem_input:
+                filtros['sort_by'], filtros['order'] = sort_by, order
+                ordem = descricao
+                print(f"Combinado, os {descricao} primeiro!\n")
+                break
+
         mensagens_busca = [
             "\n🔎 Certo, deixe eu dar uma olhada aqui no que temos.",
             "\n🔎 Beleza! Vou procurar no banco de dados pra achar suas opções.",
@@ -128,20 +175,19 @@ def virtual_agent():
         print(random.choice(mensagens_busca))
         print("Pode demorar um pouquinho, estou buscando...\n")
 
-        response = send_mcp_request(MCPMethod.SEARCH_VEHICLES, filtros)
-
-        if response.get("result") and "results" in response["result"]:
-            results = response["result"]["results"]
-            if results:
-                mensagens_sucesso = [
-                    f"{len(results)} resultados encontrados com base nas suas respostas!",
-                    f"✅ Achei {len(results)} carros que podem te agradar.",
-                    f"Boas notícias! Tenho {len(results)} opções pra você.",
-                    f"💫 Muito bem! Encontrei {len(results)} carros que podem te satisfazer."
-                ]
-                print(random.choice(mensagens_sucesso))
-                print()
-                for i, v in enumerate(results, 1):
+        # combustível fora da lista vai como digitado: casa pelo começo do nome
+        filtros['match'] = 'prefix'
+        # só os campos que aparecem na listagem abaixo
+        filtros['fields'] = ['id', 'marca', 'modelo', 'ano', 'cor', 'quilometragem',
+                             'tp_transmissao', 'tp_combustivel', 'preco', 'disponivel']
+        # resultados chegam aos poucos: cada carro é mostrado assim que chega
+        filtros['chunk_size'] = 10
+        try:
+            vendidos = {}  # posição na listagem -> carro vendido
+            with stream_mcp_search(filtros) as busca:
+                total = 0
+                for i, v in enumerate(busca, 1):
+                    total = i
                     status = "🟢" if v['disponivel'] else "🔴"
                     print(f"{i}. {status} {v['marca']} {v['modelo']} ({v['ano']})")
                     print(f"     {v['cor']} | 📊 {v['quilometragem']:,} km")
@@ -151,11 +197,29 @@ def virtual_agent():
                         print("    ✅ Disponível pra test-drive!")
                     else:
                         print("    ⏳ Já foi vendido, mas posso procurar outros similares!")
+                        vendidos[i] = v
                     print()
+
+            if total:
+                mensagens_sucesso = [
+                    f"{total} resultados encontrados com base nas suas respostas!",
+                    f"✅ Achei {total} carros que podem te agradar.",
+                    f"Boas notícias! Tenho {total} opções pra você.",
+                    f"💫 Muito bem! Encontrei {total} carros que podem te satisfazer."
+                ]
+                print(random.choice(mensagens_sucesso))
+                if busca.summary.get("next_cursor"):
+                    print(f"Mostrei os {total} {ordem}. Se quiser, refine a busca pra ver outras opções.")
+                print()
             else:
                 print("📝 Nenhum carro encontrado com essas características.\n")
-        else:
-            erro = response.get('error', 'Resposta inválida do servidor')
+
+            if vendidos:
+                escolha = input("🔄 Quer ver carros parecidos com algum vendido? Diga o número dele (ou Enter pra pular): ")
+                numero = parse_number(escolha)
+                if numero in vendidos:
+                    mostrar_similares(vendidos[numero])
+        except (ConnectionError, OSError, ValueError) as erro:
             print(f"❌ Ocorreu um problema: {erro}\nTenta de novo em alguns minutos!\n")
 
         sair = input("🔁 Deseja fazer uma nova busca? (s/n): ").strip().lower()
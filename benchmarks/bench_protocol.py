@@ -0,0 +1,128 @@
+"""
+Benchmark: wire encoding of a large search response.
+
+    python3 -m benchmarks.bench_protocol --vehicles 10000
+
+Builds one response carrying `--vehicles` vehicles and prints, for every
+codec / layout combination, the encoded size and the median time to encode
+and decode it, then the same with zlib frame compression (time to compress
+plus decompress). "json indent=2" is the encoding used before compact JSON.
+
+Then measures the per-message overhead of the protocol objects in messages
+per second (`--messages` iterations each): building a request, parsing one
+(validated and trusted), building and serialising a response, and a full
+decode -> parse -> respond -> encode round trip of a small request.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+import zlib
+
+from mcp.protocol import (
+    CODECS, COMPRESS_LEVEL, JSON_CODEC, MCPMessage, MCPMethod, MCPRequest, create_success_response,
+    decompress_payload, pack_rows
+)
+from popular_bd import categoria_por_modelo, combustiveis, cores, modelos_por_marca, transmissoes
+
+
+def _vehicles(count: int):
+    vehicles = []
+    for vehicle_id in range(1, count + 1):
+        marca = random.choice(list(modelos_por_marca))
+        modelo = random.choice(modelos_por_marca[marca])
+        vehicles.append({
+            "id": vehicle_id,
+            "marca": marca,
+            "modelo": modelo,
+            "ano": random.randint(2005, 2025),
+            "motorizacao": f"{random.randint(1, 3)}.{random.choice('068')}",
+            "tp_combustivel": random.choice(combustiveis),
+            "tp_transmissao": random.choice(transmissoes),
+            "num_portas": random.choice([2, 4]),
+            "modelo_carro": categoria_por_modelo[modelo],
+            "cor": random.choice(cores),
+            "quilometragem": random.randint(1000, 500_000),
+            "preco": round(random.uniform(30000, 250000), 2),
+            "disponivel": random.random() < 0.75,
+        })
+    return vehicles
+
+
+def _median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def _per_second(fn, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return count / (time.perf_counter() - started)
+
+
+def bench_messages(count: int):
+    request = MCPRequest(MCPMethod.SEARCH_VEHICLES, {"marca": "Toyota", "limit": 10})
+    data = request.to_dict()
+    raw = JSON_CODEC.encode(data)
+    result = {"results": [], "count": 0, "next_cursor": None}
+
+    cases = [
+        ("new request", lambda: MCPRequest(MCPMethod.HEALTH_CHECK, {})),
+        ("parse request", lambda: MCPMessage.from_dict(data)),
+        ("parse request (trusted)", lambda: MCPMessage.from_dict(data, trusted=True)),
+        ("response to_dict", lambda: create_success_response(request, result).to_dict()),
+        ("round trip", lambda: JSON_CODEC.encode(
+            create_success_response(MCPMessage.from_dict(JSON_CODEC.decode(raw)), result).to_dict()
+        )),
+    ]
+    print(f"\n{'message path':<26} {'msg/s':>12}")
+    for name, fn in cases:
+        print(f"{name:<26} {_per_second(fn, count):>12,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vehicles", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--messages", type=int, default=200_000)
+    args = parser.parse_args()
+
+    vehicles = _vehicles(args.vehicles)
+    request = MCPRequest(MCPMethod.SEARCH_VEHICLES, {})
+    result = {"results": vehicles, "count": len(vehicles), "next_cursor": None}
+    layouts = {
+        "objects": create_success_response(request, result).to_dict(),
+        "rows": create_success_response(request, pack_rows(result)).to_dict(),
+    }
+
+    cases = [("json indent=2", "objects", lambda obj: json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8"),
+              json.loads)]
+    for name, codec in CODECS.items():
+        for layout in layouts:
+            cases.append((name, layout, codec.encode, codec.decode))
+
+    print(f"{args.vehicles} vehicles per response\n")
+    print(f"{'codec':<14} {'layout':<8} {'bytes':>11} {'encode ms':>10} {'decode ms':>10}"
+          f" {'zlib bytes':>11} {'zlib ms':>8}")
+    for name, layout, encode, decode in cases:
+        message = layouts[layout]
+        payload = encode(message)
+        encode_ms = _median_ms(lambda: encode(message), args.repeat)
+        decode_ms = _median_ms(lambda: decode(payload), args.repeat)
+        compressed = zlib.compress(payload, COMPRESS_LEVEL)
+        zlib_ms = _median_ms(lambda: decompress_payload(zlib.compress(payload, COMPRESS_LEVEL)), args.repeat)
+        print(f"{name:<14} {layout:<8} {len(payload):>11,} {encode_ms:>10.2f} {decode_ms:>10.2f}"
+              f" {len(compressed):>11,} {zlib_ms:>8.2f}")
+
+    bench_messages(args.messages)
+
+
+if __name__ == "__main__":
+    main()
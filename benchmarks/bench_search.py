@@ -0,0 +1,77 @@
+"""
+Benchmark: search_vehicles through SQL vs the in-memory columnar engine.
+
+    python3 -m benchmarks.bench_search --rows 1000000
+
+Builds (or reuses) a separate SQLite file with `--rows` random vehicles, then
+times every search in COMMON_SEARCHES on both paths and prints the median
+latency of each.
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models import Veiculos, criar_engine, migrar_banco
+from mcp.columnar import ColumnarInventory
+from mcp.search import COMMON_SEARCHES, search_sql
+from popular_bd import alimentar_banco
+
+
+def prepare(engine, rows: int, batch: int = 50_000):
+    migrar_banco(engine)
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(Veiculos)).scalar()
+    missing = rows - existing
+    if missing <= 0:
+        return
+    print(f"Inserting {missing} rows...")
+    started = time.perf_counter()
+    # a fresh file loads faster without indexes; they are rebuilt (and analysed) at the end
+    alimentar_banco(missing, lote=batch, engine=engine, massa=True, reconstruir_indices=existing == 0)
+    print(f"  done in {time.perf_counter() - started:.1f}s")
+
+
+def _median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--db", default="bench_inventario.db")
+    parser.add_argument("--repeat", type=int, default=15)
+    args = parser.parse_args()
+
+    engine = criar_engine(os.path.abspath(args.db))
+    prepare(engine, args.rows)
+
+    started = time.perf_counter()
+    columnar = ColumnarInventory(engine)
+    print(f"Columnar snapshot loaded in {time.perf_counter() - started:.1f}s\n")
+
+    print(f"{'search':<58} {'sql ms':>9} {'columnar ms':>12} {'speedup':>8}")
+    with Session(bind=engine) as session:
+        for params in COMMON_SEARCHES:
+            sql_ms = _median_ms(lambda: search_sql(session, params), args.repeat)
+            label = str(params)[:58]
+            if "text" in params:  # served by the FTS index, never by the columnar engine
+                print(f"{label:<58} {sql_ms:>9.2f} {'-':>12} {'-':>8}")
+                continue
+            col_ms = _median_ms(lambda: columnar.search(params), args.repeat)
+            print(f"{label:<58} {sql_ms:>9.2f} {col_ms:>12.2f} {sql_ms / col_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
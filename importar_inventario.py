@@ -0,0 +1,294 @@
+"""
+Importa o inventario real de uma loja (CSV ou JSON Lines) para a tabela carros.
+
+    python3 importar_inventario.py carros.csv
+    python3 importar_inventario.py feed.jsonl --banco big.db --massa
+
+O arquivo e lido em streaming, `--lote` linhas por vez, entao a memoria fica constante
+mesmo para feeds de varios GB. Cada linha e validada contra VehicleResponse e os enums de
+mcp/message_type.py (cor, combustivel, transmissao e categoria aceitam qualquer caixa e
+acento: 'automatica' vira 'Automática'). Linhas com id atualizam o carro com esse id
+(upsert); sem id o carro e inserido. Linhas invalidas vao para o arquivo de rejeitados,
+no mesmo formato da entrada e com as colunas _linha e _motivo na frente, para corrigir
+e importar de novo.
+"""
+
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import time
+from datetime import date
+from functools import lru_cache
+from typing import Optional
+
+from pydantic import Field, ValidationError, field_validator
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import CAMPOS_NORMALIZADOS, Veiculos, criar_engine, normalizar
+from mcp.message_type import Cores, ModeloCarro, TipoCombustivel, TipoTransmissao, VehicleResponse
+from popular_bd import conexao_de_carga, em_lotes
+
+FORMATOS = ("csv", "jsonl")
+
+# campos de VehicleResponse que existem em carros (descricao nao e gravada)
+CAMPOS = [campo for campo in VehicleResponse.model_fields if campo in Veiculos.__table__.c]
+_CAMPOS = set(CAMPOS)
+
+# marca, modelo, cor... se repetem muito num feed; limitado para a memoria nao crescer com o arquivo
+_normalizar = lru_cache(maxsize=65_536)(normalizar)
+
+# valor normalizado -> valor canonico do enum
+CANONICOS = {
+    campo: {normalizar(item.value): item.value for item in enum}
+    for campo, enum in {
+        "cor": Cores,
+        "tp_combustivel": TipoCombustivel,
+        "tp_transmissao": TipoTransmissao,
+        "modelo_carro": ModeloCarro,
+    }.items()
+}
+
+
+class VeiculoImportado(VehicleResponse):
+    # id opcional: com id a linha atualiza (ou cria) esse carro, sem id e inserida
+    id: Optional[int] = Field(None, ge=1)
+    ano: int = Field(ge=1900)
+    num_portas: int = Field(ge=1, le=6)
+    quilometragem: int = Field(ge=0)
+    preco: float = Field(gt=0)
+    disponivel: bool = True
+
+    @field_validator("marca", "modelo", "motorizacao", mode="before")
+    @classmethod
+    def _texto(cls, valor):
+        # feeds em JSON trazem motorizacao como numero (1.6)
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            valor = str(valor)
+        if isinstance(valor, str):
+            valor = " ".join(valor.split())
+            if not valor:
+                raise ValueError("vazio")
+        return valor
+
+    @field_validator(*CANONICOS)
+    @classmethod
+    def _no_enum(cls, valor, info):
+        canonico = CANONICOS[info.field_name].get(_normalizar(valor))
+        if canonico is None:
+            raise ValueError(f"deve ser um de {', '.join(CANONICOS[info.field_name].values())}")
+        return canonico
+
+    @field_validator("ano")
+    @classmethod
+    def _ano_ate_o_proximo(cls, valor):
+        if valor > date.today().year + 1:
+            raise ValueError(f"maior que {date.today().year + 1}")
+        return valor
+
+
+def validar(dados) -> dict:
+    """Linha crua (dict do CSV/JSON) -> dict pronto para insert, com as colunas *_norm.
+
+    Levanta ValueError (ValidationError e subclasse) com o motivo quando a linha e invalida.
+    """
+    if not isinstance(dados, dict):
+        raise ValueError("a linha nao e um objeto JSON")
+    # no CSV celula vazia e ausencia de valor
+    veiculo = VeiculoImportado.model_validate({campo: None if valor == "" else valor
+                                               for campo, valor in dados.items()})
+    linha = veiculo.model_dump(include=_CAMPOS)
+    for campo, campo_norm in CAMPOS_NORMALIZADOS.items():
+        linha[campo_norm] = _normalizar(linha[campo])
+    return linha
+
+
+def _motivo(erro: ValueError) -> str:
+    if not isinstance(erro, ValidationError):
+        return str(erro)
+    motivos = []
+    for item in erro.errors():
+        campo = ".".join(str(parte) for parte in item["loc"]) or "linha"
+        if item["type"] == "missing" or item.get("input", "") is None:
+            mensagem = "obrigatorio"
+        else:
+            mensagem = item["msg"].removeprefix("Value error, ")
+        motivos.append(f"{campo}: {mensagem}")
+    return "; ".join(motivos)
+
+
+def _upsert():
+    stmt = sqlite_insert(Veiculos)
+    colunas = [campo for campo in CAMPOS if campo != "id"] + list(CAMPOS_NORMALIZADOS.values())
+    return stmt.on_conflict_do_update(index_elements=["id"], set_={c: stmt.excluded[c] for c in colunas})
+
+
+def formato_do_arquivo(caminho: str) -> str:
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    return "csv"
+
+
+class LeitorInventario:
+    """Itera (numero_da_linha, dados) de um CSV ou JSON Lines sem carregar o arquivo.
+
+    Em JSON Lines, uma linha que nao e JSON valido vem como str (e validar a rejeita).
+    `posicao` e quantos bytes do arquivo ja foram lidos, para o progresso.
+    """
+
+    def __init__(self, caminho: str, formato: str, delimitador: Optional[str] = None):
+        self.formato = formato
+        self._bruto = open(caminho, "rb")
+        self._texto = io.TextIOWrapper(self._bruto, encoding="utf-8-sig", newline="")
+        self.colunas = None
+        if formato == "csv":
+            if delimitador is None:
+                amostra = self._texto.read(64 * 1024)
+                self._texto.seek(0)
+                try:
+                    delimitador = csv.Sniffer().sniff(amostra, delimiters=",;\t|").delimiter
+                except csv.Error:
+                    delimitador = ","
+            self._csv = csv.DictReader(self._texto, delimiter=delimitador)
+            self.colunas = self._csv.fieldnames or []
+
+    @property
+    def posicao(self) -> int:
+        return self._bruto.tell()
+
+    def __iter__(self):
+        if self.formato == "csv":
+            for dados in self._csv:
+                dados.pop(None, None)  # celulas a mais que o cabecalho
+                yield self._csv.line_num, dados
+            return
+        for numero, texto in enumerate(self._texto, 1):
+            if not texto.strip():
+                continue
+            try:
+                yield numero, json.loads(texto)
+            except json.JSONDecodeError:
+                yield numero, texto.rstrip("\r\n")
+
+    def close(self):
+        self._texto.close()
+
+
+class ArquivoRejeitados:
+    """Grava as linhas rejeitadas no formato da entrada, com _linha e _motivo na frente.
+
+    O arquivo so e criado na primeira rejeicao.
+    """
+
+    def __init__(self, caminho: str, formato: str, colunas=None):
+        self.caminho = caminho
+        self.formato = formato
+        self.colunas = ["_linha", "_motivo"] + list(colunas or [])
+        self._arquivo = None
+        self._csv = None
+
+    def gravar(self, numero: int, motivo: str, dados):
+        if self._arquivo is None:
+            self._arquivo = open(self.caminho, "w", encoding="utf-8", newline="")
+            if self.formato == "csv":
+                self._csv = csv.DictWriter(self._arquivo, fieldnames=self.colunas, extrasaction="ignore")
+                self._csv.writeheader()
+        if self._csv is not None:
+            self._csv.writerow({**dados, "_linha": numero, "_motivo": motivo})
+            return
+        registro = {"_linha": numero, "_motivo": motivo}
+        if isinstance(dados, dict):
+            registro.update(dados)
+        else:
+            registro["_bruto"] = dados
+        self._arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+    def close(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+
+
+def importar(caminho, engine=None, formato=None, lote=5_000, rejeitados=None, massa=False,
+             delimitador=None, intervalo_progresso=5.0) -> dict:
+    """Importa `caminho` para carros e devolve os contadores (lidas, gravadas, rejeitadas, segundos).
+
+    Cada lote e gravado e confirmado (commit) antes de ler o proximo. massa=True usa a carga
+    em massa de popular_bd.conexao_de_carga (sem gatilhos durante a carga; servidores
+    recarregam tudo uma vez no fim; ninguem mais pode escrever no banco durante a carga, ver
+    conexao_de_carga). `rejeitados` padrao: <caminho>.rejeitados.<formato>.
+    """
+    formato = formato or formato_do_arquivo(caminho)
+    if formato not in FORMATOS:
+        raise ValueError(f"formato deve ser um de {FORMATOS}")
+    rejeitados = rejeitados or f"{caminho}.rejeitados.{formato}"
+    tamanho = os.path.getsize(caminho)
+
+    leitor = LeitorInventario(caminho, formato, delimitador)
+    rejeitos = ArquivoRejeitados(rejeitados, formato, leitor.colunas)
+    contadores = {"lidas": 0, "gravadas": 0, "rejeitadas": 0}
+    stmt = _upsert()
+    inicio = ultimo_log = time.perf_counter()
+    logging.info(f"Importando {caminho} ({formato}, {tamanho / 1e6:,.1f} MB)")
+
+    def validas(registros):
+        for numero, dados in registros:
+            contadores["lidas"] += 1
+            try:
+                yield validar(dados)
+            except ValueError as erro:
+                contadores["rejeitadas"] += 1
+                rejeitos.gravar(numero, _motivo(erro), dados)
+
+    try:
+        with conexao_de_carga(engine, massa=massa) as conn:
+            for linhas in em_lotes(validas(leitor), lote):
+                conn.execute(stmt, linhas)
+                conn.commit()
+                contadores["gravadas"] += len(linhas)
+
+                agora = time.perf_counter()
+                if agora - ultimo_log >= intervalo_progresso:
+                    ultimo_log = agora
+                    logging.info(
+                        f"{leitor.posicao / max(tamanho, 1):.0%} - lidas {contadores['lidas']:,}, "
+                        f"gravadas {contadores['gravadas']:,}, rejeitadas {contadores['rejeitadas']:,} "
+                        f"({contadores['lidas'] / (agora - inicio):,.0f} linhas/s)"
+                    )
+    finally:
+        leitor.close()
+        rejeitos.close()
+
+    contadores["segundos"] = round(time.perf_counter() - inicio, 2)
+    logging.info(
+        f"Importadas {contadores['gravadas']:,} de {contadores['lidas']:,} linhas em {contadores['segundos']:.1f}s "
+        f"({contadores['lidas'] / max(contadores['segundos'], 1e-9):,.0f} linhas/s)"
+    )
+    if contadores["rejeitadas"]:
+        logging.warning(f"{contadores['rejeitadas']:,} linhas rejeitadas, ver {rejeitados}")
+    return contadores
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, force=True)  # models ja loga ao ser importado
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("arquivo", help="CSV ou JSON Lines (.jsonl/.ndjson) com um carro por linha")
+    parser.add_argument("--formato", choices=FORMATOS, default=None, help="padrao: pela extensao do arquivo")
+    parser.add_argument("--delimitador", default=None, help="separador do CSV (padrao: detectado)")
+    parser.add_argument("--lote", type=int, default=5_000, help="linhas por executemany/commit")
+    parser.add_argument("--banco", default=None, help="arquivo SQLite (padrao: inventario.db)")
+    parser.add_argument("--rejeitados", default=None, help="padrao: <arquivo>.rejeitados.<formato>")
+    parser.add_argument("--massa", action="store_true",
+                        help="carga em massa: pragmas de carga e sem gatilhos durante a importacao "
+                             "(ninguem mais pode escrever no banco enquanto isso)")
+    parser.add_argument("--progresso", type=float, default=5.0, help="segundos entre mensagens de progresso")
+    args = parser.parse_args()
+
+    alvo = criar_engine(args.banco) if args.banco else None
+    importar(
+        args.arquivo, engine=alvo, formato=args.formato, lote=args.lote, rejeitados=args.rejeitados,
+        massa=args.massa, delimitador=args.delimitador, intervalo_progresso=args.progresso,
+    )
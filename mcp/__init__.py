@@ -9,7 +9,8 @@ Include server, client and type of messages
 from .server import MCPServer
 
 # CLIENT
-from .client import  send_mcp_request          
+from .client import  send_mcp_request, MCPConnection, MCPClient
+from .async_client import AsyncMCPClient
 
 # PROTOCOL MCP
 from .protocol import (
@@ -36,6 +37,9 @@ __all__ = [
     "MCPServer",
     "agent_conversation",
     "send_mcp_request",
+    "MCPConnection",
+    "MCPClient",
+    "AsyncMCPClient",
     "MCPMessage",
     "MCPRequest",
     "MCPResponse",
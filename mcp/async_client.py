@@ -0,0 +1,304 @@
+"""
+Asyncio client for the MCP server.
+
+One AsyncMCPClient holds a single persistent connection; any number of
+coroutines can await requests on it concurrently. A background task reads
+the replies and resolves each pending future by the message `id`.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from mcp.client import HOST, PORT, check_batch_size
+from mcp.protocol import (
+    COMPRESSIONS, FRAME_HEADER, JSON_CODEC, LAYOUTS, MCPMethod, MCPRequest, codec_for_id, decode_header,
+    decompress_payload, encode_frame, get_codec, unpack_rows
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMCPClient:
+
+    def __init__(self, host: str = HOST, port: int = PORT, timeout: Optional[float] = 10,
+                 codec: str = "json", layout: str = "objects", compression: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        get_codec(codec)
+        if layout not in LAYOUTS:
+            raise ValueError(f"layout must be one of {', '.join(LAYOUTS)}")
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"compression must be one of {', '.join(COMPRESSIONS)}")
+        self.wanted_codec = codec
+        self.wanted_layout = layout
+        self.wanted_compression = compression
+        self.codec = JSON_CODEC
+        self.layout = "objects"
+        self.compress_threshold: Optional[int] = None  # set when compression was negotiated
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[str, asyncio.Future] = {}  # insertion order = oldest first
+        self._streams: Dict[str, asyncio.Queue] = {}   # streamed search id -> ("chunk" | "done" | "error", payload)
+        self._batches: List[List[str]] = []  # ids of each batch awaiting its replies
+        self._connect_lock = asyncio.Lock()
+
+    async def connect(self) -> 'AsyncMCPClient':
+        async with self._connect_lock:
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                self._reader_task = asyncio.create_task(self._read_replies())
+                self.codec, self.layout, self.compress_threshold = JSON_CODEC, "objects", None
+                if (self.wanted_codec != JSON_CODEC.name or self.wanted_layout != "objects"
+                        or self.wanted_compression is not None):
+                    try:
+                        await self._negotiate()
+                    except BaseException:
+                        # a later connect() must negotiate again, not reuse this JSON / objects connection
+                        await self.close()
+                        raise
+        return self
+
+    async def _negotiate(self):
+        # called with the connect lock held, before any other request can be written
+        params = {"codecs": [self.wanted_codec, JSON_CODEC.name], "layout": self.wanted_layout,
+                  "compression": self.wanted_compression}
+        reply = await self._send_and_wait(MCPRequest(method=MCPMethod.NEGOTIATE, params=params), None)
+        if "result" not in reply:
+            raise ConnectionError(f"Negotiation failed: {reply.get('error')}")
+        result = reply["result"]
+        self.codec = get_codec(result["codec"])
+        self.layout = result["layout"]
+        if result.get("compression"):
+            self.compress_threshold = result["compress_threshold"]
+
+    async def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+            self._writer = None
+        self._fail_pending(ConnectionError("Connection closed"))
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _read_frame(self) -> Tuple[int, bytes]:
+        codec_id, size, compressed = decode_header(await self._reader.readexactly(FRAME_HEADER.size))
+        payload = await self._reader.readexactly(size)
+        return codec_id, decompress_payload(payload) if compressed else payload
+
+    def _write(self, message):
+        # encode a message dict (or batch list) with the negotiated codec / compression
+        if self._writer is None:
+            raise ConnectionError("Not connected")
+        payload = self.codec.encode(message)
+        self._writer.write(encode_frame(payload, self.codec.codec_id, self.compress_threshold))
+
+    async def _read_replies(self):
+        try:
+            while True:
+                codec_id, data = await self._read_frame()
+                decoded = codec_for_id(codec_id).decode(data)
+                for reply in decoded if isinstance(decoded, list) else [decoded]:
+                    self._resolve(reply)
+        except asyncio.CancelledError:
+            raise
+        except (asyncio.IncompleteReadError, OSError, ValueError) as e:
+            # close the transport as close() does; the next connect() opens a new one
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except OSError:
+                    pass
+            self._fail_pending(ConnectionError(f"Connection lost: {e}"))
+
+    def _resolve(self, reply: dict):
+        if reply.get("method") == MCPMethod.SEARCH_CHUNK.value:
+            chunk = reply.get("params") or {}
+            queue = self._streams.get(chunk.get("request_id"))
+            if queue is not None:
+                queue.put_nowait(("chunk", chunk))
+            return
+        reply_id = reply.get("id")
+        if reply_id in self._streams:
+            self._streams[reply_id].put_nowait(("done", reply))
+            return
+        if reply_id in (None, "error"):
+            # an error for a whole batch (too large, server busy) answers every request in it
+            batch = next((ids for ids in self._batches if any(i in self._pending for i in ids)), None)
+            if batch is not None:
+                self._batches.remove(batch)
+                for message_id in batch:
+                    future = self._pending.pop(message_id, None)
+                    if future is not None and not future.done():
+                        future.set_result(reply)
+                return
+        future = self._pending.pop(reply_id, None)
+        if future is None and reply_id in (None, "error") and self._pending:
+            # a reply the server could not tie to a request goes to the oldest one
+            future = self._pending.pop(next(iter(self._pending)))
+        if future is None:
+            logger.debug(f"Dropping reply for abandoned request {reply_id}")
+        elif not future.done():
+            future.set_result(reply)
+
+    def _fail_pending(self, error: Exception):
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+        for queue in self._streams.values():
+            queue.put_nowait(("error", error))
+
+    async def request(self, method: MCPMethod, params: Optional[dict] = None,
+                      timeout: Optional[float] = None) -> dict:
+        """Send a request and await its reply; cancelling the caller abandons the reply."""
+        await self.connect()
+        return await self._send_and_wait(MCPRequest(method=method, params=params), timeout)
+
+    async def _send_and_wait(self, request: MCPRequest, timeout: Optional[float]) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request.message_id] = future
+        try:
+            self._write(request.to_dict())
+            await self._writer.drain()
+            return await asyncio.wait_for(future, timeout if timeout is not None else self.timeout)
+        finally:
+            # on timeout or cancellation the late reply is simply dropped by the reader
+            self._pending.pop(request.message_id, None)
+
+    async def batch(self, calls: List[Tuple[MCPMethod, dict]], timeout: Optional[float] = None) -> List[dict]:
+        """Send the calls as one JSON-RPC batch frame; replies come back in call order."""
+        check_batch_size(len(calls))
+        await self.connect()
+        requests = [MCPRequest(method=method, params=params) for method, params in calls]
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in requests]
+        for request, future in zip(requests, futures):
+            self._pending[request.message_id] = future
+        ids = [request.message_id for request in requests]
+        self._batches.append(ids)
+        try:
+            self._write([request.to_dict() for request in requests])
+            await self._writer.drain()
+            return await asyncio.wait_for(
+                asyncio.gather(*futures), timeout if timeout is not None else self.timeout
+            )
+        finally:
+            for request in requests:
+                self._pending.pop(request.message_id, None)
+            if ids in self._batches:
+                self._batches.remove(ids)
+
+    async def search_vehicles(self, timeout: Optional[float] = None, **filters) -> dict:
+        return await self.request(MCPMethod.SEARCH_VEHICLES, filters, timeout)
+
+    async def get_vehicle(self, vehicle_id: int, fields: Optional[List[str]] = None,
+                          timeout: Optional[float] = None) -> dict:
+        params = {"id": vehicle_id}
+        if fields is not None:
+            params["fields"] = list(fields)
+        return await self.request(MCPMethod.GET_VEHICLE, params, timeout)
+
+    async def get_vehicles(self, vehicle_ids: List[int], fields: Optional[List[str]] = None,
+                           timeout: Optional[float] = None) -> dict:
+        params = {"ids": list(vehicle_ids)}
+        if fields is not None:
+            params["fields"] = list(fields)
+        return await self.request(MCPMethod.GET_VEHICLES, params, timeout)
+
+    async def list_filters(self, timeout: Optional[float] = None, **filters) -> dict:
+        return await self.request(MCPMethod.LIST_FILTERS, filters, timeout)
+
+    async def similar_vehicles(self, vehicle_id: int, k: Optional[int] = None, fields: Optional[List[str]] = None,
+                               timeout: Optional[float] = None) -> dict:
+        params = {"id": vehicle_id}
+        if k is not None:
+            params["k"] = k
+        if fields is not None:
+            params["fields"] = list(fields)
+        return await self.request(MCPMethod.SIMILAR_VEHICLES, params, timeout)
+
+    async def health_check(self, timeout: Optional[float] = None) -> dict:
+        return await self.request(MCPMethod.HEALTH_CHECK, {}, timeout)
+
+    async def stream_search(self, timeout: Optional[float] = None, **filters) -> 'AsyncSearchStream':
+        """Streamed search_vehicles: `async for` over the vehicles while the server is still sending them."""
+        await self.connect()
+        request = MCPRequest(method=MCPMethod.SEARCH_VEHICLES, params={**filters, "stream": True})
+        queue: asyncio.Queue = asyncio.Queue()
+        self._streams[request.message_id] = queue
+        try:
+            self._write(request.to_dict())
+            await self._writer.drain()
+        except Exception:
+            self._streams.pop(request.message_id, None)
+            raise
+        return AsyncSearchStream(self, request.message_id, queue,
+                                 timeout if timeout is not None else self.timeout)
+
+
+class AsyncSearchStream:
+    """Async iterator over a streamed search; `summary` holds count / next_cursor once exhausted.
+
+    `timeout` applies to the wait for each chunk. Leaving early (`aclose`) only
+    drops the chunks still on their way; the connection stays usable.
+    """
+
+    def __init__(self, client: AsyncMCPClient, message_id: str, queue: asyncio.Queue, timeout: Optional[float]):
+        self.summary: Optional[dict] = None
+        self._client = client
+        self._message_id = message_id
+        self._queue = queue
+        self._timeout = timeout
+        self._buffered: List[dict] = []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        while not self._buffered:
+            if self.summary is not None:
+                raise StopAsyncIteration
+            try:
+                kind, payload = await asyncio.wait_for(self._queue.get(), self._timeout)
+            except BaseException:
+                await self.aclose()
+                raise
+            if kind == "chunk":
+                self._buffered = unpack_rows(payload)["results"][::-1]
+            elif kind == "error":
+                await self.aclose()
+                raise payload
+            else:
+                await self.aclose()
+                if "error" in payload:
+                    raise ValueError(f"Search failed: {payload['error'].get('message')}")
+                self.summary = payload["result"]
+        return self._buffered.pop()
+
+    async def aclose(self):
+        self._client._streams.pop(self._message_id, None)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
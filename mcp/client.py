@@ -1,51 +1,521 @@
 import socket
 import json
-from mcp.protocol import MCPRequest, MCPMethod  
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from mcp.protocol import (
+    COMPRESSIONS, JSON_CODEC, LAYOUTS, MAX_BATCH_SIZE, MCPRequest, MCPMethod, codec_for_id, get_codec, recv_frame,
+    send_frame, unpack_rows
+)
 
 HOST = '127.0.0.1'
 PORT = 65432
 
-def send_mcp_request(method: MCPMethod, params: dict) -> dict:
 
+def check_batch_size(size: int):
+    # the server answers an empty or oversized batch with a single error; refuse it before sending
+    if not 1 <= size <= MAX_BATCH_SIZE:
+        raise ValueError(f"A batch takes 1 to {MAX_BATCH_SIZE} calls, got {size}")
+
+
+class MCPConnection:
+    """Persistent connection that carries many requests.
+
+    Requests can be pipelined: several are written before any reply is read,
+    and replies (which the server may send out of order) are matched back to
+    their request by the message `id`.
+
+    `codec` and `layout` are negotiated with the server right after connecting
+    (see protocol.CODECS / LAYOUTS); with the defaults nothing is negotiated.
+    """
 
-    request = MCPRequest(method=method, params=params)
+    def __init__(self, host: str = HOST, port: int = PORT, timeout: float = 10,
+                 codec: str = "json", layout: str = "objects", compression: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        get_codec(codec)  # fail early if this side cannot decode it
+        if layout not in LAYOUTS:
+            raise ValueError(f"layout must be one of {', '.join(LAYOUTS)}")
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"compression must be one of {', '.join(COMPRESSIONS)}")
+        self.wanted_codec = codec
+        self.wanted_layout = layout
+        self.wanted_compression = compression
+        self.codec = JSON_CODEC   # what requests are encoded with; replies carry their own codec id
+        self.layout = "objects"
+        self.compress_threshold: Optional[int] = None  # set when compression was negotiated
+        self._sock: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._responses: Dict[str, dict] = {}  # replies read but not yet claimed
+        self._outstanding: List[str] = []       # ids sent and not yet answered, oldest first
+        self._batches: List[List[str]] = []     # ids of each batch sent and not yet answered
+        self._chunks: Dict[str, deque] = {}     # streamed search id -> SEARCH_CHUNK params not yet consumed
+        self._reading = False
 
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.settimeout(10)  #limit of five seconds
+    def connect(self) -> 'MCPConnection':
+        if self._sock is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._sock = sock
+            self.codec, self.layout, self.compress_threshold = JSON_CODEC, "objects", None
+            if (self.wanted_codec != JSON_CODEC.name or self.wanted_layout != "objects"
+                    or self.wanted_compression is not None):
+                self._negotiate()
+        return self
+
+    def _negotiate(self):
+        params = {"codecs": [self.wanted_codec, JSON_CODEC.name], "layout": self.wanted_layout,
+                  "compression": self.wanted_compression}
+        reply = self.request(MCPMethod.NEGOTIATE, params)
+        if "result" not in reply:
+            self.close()
+            raise ConnectionError(f"Negotiation failed: {reply.get('error')}")
+        result = reply["result"]
+        self.codec = get_codec(result["codec"])
+        self.layout = result["layout"]
+        if result.get("compression"):
+            self.compress_threshold = result["compress_threshold"]
+
+    def _send_message(self, message):
+        # caller holds the send lock
+        payload = self.codec.encode(message)
+        send_frame(self._sock, payload, self.codec.codec_id, self.compress_threshold)
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def close(self):
+        with self._send_lock:
+            if self._sock is not None:
+                try:
+                    self._sock.close()
+                finally:
+                    self._sock = None
+        with self._cond:
+            self._cond.notify_all()
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send(self, request: MCPRequest) -> str:
+        """Write a request without waiting for its reply; returns the id to wait on."""
+        self.connect()
+        with self._cond:
+            self._outstanding.append(request.message_id)
+        try:
+            with self._send_lock:
+                self._send_message(request.to_dict())
+        except OSError:
+            with self._cond:
+                self._outstanding.remove(request.message_id)
+            self.close()
+            raise
+        return request.message_id
+
+    def send_batch(self, requests: List[MCPRequest]) -> List[str]:
+        """Write several requests as one JSON-RPC batch frame; returns their ids."""
+        check_batch_size(len(requests))
+        self.connect()
+        ids = [request.message_id for request in requests]
+        with self._cond:
+            self._outstanding.extend(ids)
+            self._batches = [batch for batch in self._batches if any(i in self._outstanding for i in batch)]
+            self._batches.append(ids)
         try:
-            s.connect((HOST, PORT))
-            s.sendall(request.to_json().encode('utf-8'))
+            with self._send_lock:
+                self._send_message([request.to_dict() for request in requests])
+        except OSError:
+            with self._cond:
+                for message_id in ids:
+                    self._outstanding.remove(message_id)
+                self._batches.remove(ids)
+            self.close()
+            raise
+        return ids
 
-            # receive all the data
-            response_data = b""
+    def wait_for(self, message_id: str) -> dict:
+        """Block until the reply to `message_id` arrives; other replies read meanwhile are kept."""
+        self._wait_until(lambda: message_id in self._responses)
+        with self._cond:
+            return self._responses.pop(message_id)
+
+    def _wait_until(self, ready):
+        # block until ready() (checked under the lock) holds, reading frames if no other thread is
+        with self._cond:
             while True:
-                try:
-                    chunk = s.recv(4096)
-                    if not chunk:
-                        break
-                    response_data += chunk
-
-                    try:
-                        parsed = json.loads(response_data.decode('utf-8'))
-                        return parsed  
-                    except json.JSONDecodeError:
-                        continue 
-                except socket.timeout:
-                    print("Tentando finalizar...")
+                if ready():
+                    return
+                if self._sock is None:
+                    raise ConnectionError("Connection closed while waiting for a response")
+                if not self._reading:
+                    self._reading = True
                     break
+                self._cond.wait()
+
+        # this thread is the reader until its own reply shows up
+        try:
+            while True:
+                frame = recv_frame(self._sock)
+                if frame is None:
+                    raise ConnectionError("Server closed the connection")
+                codec_id, data = frame
+                decoded = codec_for_id(codec_id).decode(data)
+                replies = decoded if isinstance(decoded, list) else [decoded]  # batch replies
+                with self._cond:
+                    for reply in replies:
+                        self._route(reply)
+                    self._cond.notify_all()
+                    if ready():
+                        return
+        except (OSError, ValueError):
+            self.close()
+            raise
+        finally:
+            with self._cond:
+                self._reading = False
+                self._cond.notify_all()
+
+    def _route(self, reply: dict):
+        if reply.get("method") == MCPMethod.SEARCH_CHUNK.value:
+            chunk = reply.get("params") or {}
+            if chunk.get("request_id") in self._chunks:
+                self._chunks[chunk["request_id"]].append(chunk)
+            return
+        reply_id = reply.get("id")
+        if reply_id in (None, "error"):
+            # an error for a whole batch (too large, server busy) answers every request in it
+            batch = next((ids for ids in self._batches if any(i in self._outstanding for i in ids)), None)
+            if batch is not None:
+                self._batches.remove(batch)
+                for message_id in batch:
+                    if message_id in self._outstanding:
+                        self._outstanding.remove(message_id)
+                        self._responses[message_id] = reply
+                return
+            # other replies the server could not tie to a request go to the oldest pending one
+            if self._outstanding:
+                reply_id = self._outstanding[0]
+        if reply_id not in self._outstanding:
+            return  # nobody waits for it (e.g. a reply to a notification): keeping it would leak
+        self._outstanding.remove(reply_id)
+        self._responses[reply_id] = reply
+
+    def request(self, method: MCPMethod, params: Optional[dict] = None) -> dict:
+        return self.wait_for(self.send(MCPRequest(method=method, params=params)))
+
+    def pipeline(self, calls: List[Tuple[MCPMethod, dict]]) -> List[dict]:
+        """Send every call first, then collect the replies in call order."""
+        ids = [self.send(MCPRequest(method=method, params=params)) for method, params in calls]
+        return [self.wait_for(message_id) for message_id in ids]
+
+    def batch(self, calls: List[Tuple[MCPMethod, dict]]) -> List[dict]:
+        """Send the calls as one JSON-RPC batch (one round trip); replies come back in call order."""
+        ids = self.send_batch([MCPRequest(method=method, params=params) for method, params in calls])
+        return [self.wait_for(message_id) for message_id in ids]
+
+    def stream_search(self, **filters) -> 'SearchStream':
+        """Streamed search_vehicles: iterate over the vehicles while the server is still sending them."""
+        return SearchStream(self, filters)
+
+
+class SearchStream:
+    """Iterator over the vehicles of a streamed search.
+
+    Vehicles are yielded chunk by chunk as they arrive. Once the iterator is
+    exhausted, `summary` holds the final response (count, next_cursor, chunks).
+    Closing it early closes the connection, which stops the server's stream.
+    `release` is called once the stream is over (used to return pooled connections).
+    """
+
+    def __init__(self, conn: MCPConnection, filters: dict, release=None):
+        self.summary: Optional[dict] = None
+        self._conn = conn
+        self._release = release
+        self._finished = False
+        request = MCPRequest(method=MCPMethod.SEARCH_VEHICLES, params={**filters, "stream": True})
+        self._message_id = request.message_id
+        with conn._cond:
+            conn._chunks[self._message_id] = deque()
+        conn.send(request)
+        self._vehicles = self._iterate()
+
+    def __iter__(self):
+        return self._vehicles
+
+    def __next__(self) -> dict:
+        return next(self._vehicles)
+
+    def close(self):
+        self._vehicles.close()
+        self._finish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        with self._conn._cond:
+            self._conn._chunks.pop(self._message_id, None)
+        if self.summary is None:
+            self._conn.close()  # abandoned or failed mid-stream
+        if self._release is not None:
+            self._release()
+
+    def _iterate(self):
+        conn, message_id = self._conn, self._message_id
+        chunks = conn._chunks[message_id]
+        try:
+            while True:
+                conn._wait_until(lambda: chunks or message_id in conn._responses)
+                with conn._cond:
+                    chunk = chunks.popleft() if chunks else None
+                    reply = conn._responses.pop(message_id) if chunk is None else None
+                if chunk is not None:
+                    yield from unpack_rows(chunk)["results"]
+                    continue
+                if "error" in reply:
+                    raise ValueError(f"Search failed: {reply['error'].get('message')}")
+                self.summary = reply["result"]
+                return
+        finally:
+            self._finish()
 
-            #  decode what receive
-            response_str = response_data.decode('utf-8').strip()
-            if not response_str:
-                return {"error": "Empty response from server"}
+
+class MCPClient:
+    """Thread-safe pool of warm MCPConnections to one or more servers.
+
+    Connections are checked out exclusively, returned after use and reused
+    most-recently-used first. Connections idle for longer than `idle_timeout`
+    are closed; ones idle for longer than `health_check_interval` are probed
+    with HEALTH_CHECK before being handed out again.
+    """
+
+    def __init__(
+        self,
+        servers: Optional[List[Tuple[str, int]]] = None,
+        pool_size: int = 8,
+        idle_timeout: float = 60.0,
+        health_check_interval: float = 15.0,
+        timeout: float = 10,
+        codec: str = "json",
+        layout: str = "objects",
+        compression: Optional[str] = None,
+    ):
+        self.servers = list(servers or [(HOST, PORT)])
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self.codec = codec
+        self.layout = layout
+        self.compression = compression
+
+        self._cond = threading.Condition()
+        self._idle: deque = deque()  # (connection, last_used), most recent on the right
+        self._open = 0               # connections created and not yet closed
+        self._next_server = 0
+        self._closed = False
+
+    def _evict_idle(self, now: float) -> List[MCPConnection]:
+        # caller holds the lock; oldest connections sit on the left
+        evicted = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            evicted.append(self._idle.popleft()[0])
+            self._open -= 1
+        return evicted
+
+    def _new_connection(self) -> MCPConnection:
+        # round-robin over the servers, skipping the ones that refuse connections
+        last_error: Optional[Exception] = None
+        for _ in range(len(self.servers)):
+            with self._cond:
+                host, port = self.servers[self._next_server % len(self.servers)]
+                self._next_server += 1
             try:
-                return json.loads(response_str)
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON decode error: {e}")
-                print(f"📄 Response preview: {response_str[:200]}...")
-                return {"error": f"Invalid JSON: {e}"}
+                return MCPConnection(
+                    host, port, self.timeout, self.codec, self.layout, self.compression
+                ).connect()
+            except OSError as e:
+                last_error = e
+        raise ConnectionError(f"No MCP server reachable: {last_error}")
+
+    def _is_healthy(self, conn: MCPConnection) -> bool:
+        try:
+            reply = conn.request(MCPMethod.HEALTH_CHECK, {})
+            return reply.get("result", {}).get("status") == "ok"
+        except (OSError, ValueError):
+            return False
+
+    def checkout(self, timeout: Optional[float] = None) -> MCPConnection:
+        """Borrow a connection, waiting up to `timeout` seconds when the pool is exhausted."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            create = False
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("MCPClient is closed")
+                evicted = self._evict_idle(time.monotonic())
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                elif self._open < self.pool_size:
+                    self._open += 1
+                    create = True
+                else:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("Timed out waiting for a free MCP connection")
+                    self._cond.wait(remaining)
+                    continue
+            for stale in evicted:
+                stale.close()
+
+            if create:
+                try:
+                    return self._new_connection()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+
+            if time.monotonic() - last_used < self.health_check_interval or self._is_healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def checkin(self, conn: MCPConnection, healthy: bool = True):
+        """Return a borrowed connection; broken ones are closed instead of pooled."""
+        if not healthy or not conn.connected or self._closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn: MCPConnection):
+        conn.close()
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        conn = self.checkout(timeout)
+        healthy = False
+        try:
+            yield conn
+            healthy = True
+        finally:
+            self.checkin(conn, healthy)
+
+    def request(self, method: MCPMethod, params: Optional[dict] = None) -> dict:
+        # a pooled connection may have been closed by the server; retry once on a fresh one
+        for attempt in range(2):
+            try:
+                with self.connection() as conn:
+                    return conn.request(method, params)
+            except (ConnectionError, BrokenPipeError):
+                if attempt == 1:
+                    raise
+
+    def batch(self, calls: List[Tuple[MCPMethod, dict]]) -> List[dict]:
+        with self.connection() as conn:
+            return conn.batch(calls)
 
-        except (ConnectionRefusedError, socket.timeout) as e:
-            return {"error": f"Connection failed: {e}"}
+    def stream_search(self, **filters) -> SearchStream:
+        """Streamed search on a pooled connection; it goes back to the pool when the stream ends."""
+        conn = self.checkout()
+        try:
+            return SearchStream(conn, filters, release=lambda: self.checkin(conn, conn.connected))
+        except Exception:
+            self.checkin(conn, healthy=False)
+            raise
+
+    def search_vehicles(self, **filters) -> dict:
+        return self.request(MCPMethod.SEARCH_VEHICLES, filters)
+
+    def get_vehicle(self, vehicle_id: int, fields: Optional[List[str]] = None) -> dict:
+        params = {"id": vehicle_id}
+        if fields is not None:
+            params["fields"] = list(fields)
+        return self.request(MCPMethod.GET_VEHICLE, params)
+
+    def get_vehicles(self, vehicle_ids: List[int], fields: Optional[List[str]] = None) -> dict:
+        params = {"ids": list(vehicle_ids)}
+        if fields is not None:
+            params["fields"] = list(fields)
+        return self.request(MCPMethod.GET_VEHICLES, params)
+
+    def list_filters(self, **filters) -> dict:
+        return self.request(MCPMethod.LIST_FILTERS, filters)
+
+    def similar_vehicles(self, vehicle_id: int, k: Optional[int] = None, fields: Optional[List[str]] = None) -> dict:
+        params = {"id": vehicle_id}
+        if k is not None:
+            params["k"] = k
+        if fields is not None:
+            params["fields"] = list(fields)
+        return self.request(MCPMethod.SIMILAR_VEHICLES, params)
+
+    def health_check(self) -> dict:
+        return self.request(MCPMethod.HEALTH_CHECK, {})
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"open": self._open, "idle": len(self._idle), "pool_size": self.pool_size}
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._open -= len(idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_client: Optional[MCPClient] = None
+_default_lock = threading.Lock()
+
+
+def _get_default_client() -> MCPClient:
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = MCPClient([(HOST, PORT)])
+        return _default_client
+
+
+def send_mcp_request(method: MCPMethod, params: dict) -> dict:
+    # goes through the module-level connection pool
+    try:
+        return _get_default_client().request(method, params)
+    except json.JSONDecodeError as e:
+        print(f"❌ JSON decode error: {e}")
+        return {"error": f"Invalid JSON: {e}"}
+    except (ConnectionError, TimeoutError, OSError) as e:
+        return {"error": f"Connection failed: {e}"}
 
 
+def stream_mcp_search(params: dict) -> SearchStream:
+    # streamed search_vehicles through the module-level pool; iterate it to get the vehicles
+    return _get_default_client().stream_search(**params)
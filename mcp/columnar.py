@@ -0,0 +1,568 @@
+"""
+In-memory columnar copy of the carros table for read-heavy serving.
+
+Rows are kept sorted by (preco, id), the order search results are paged in,
+so row position i is also the i-th cheapest car. Every filter becomes a
+bitmap over row positions (a Python int, bit i = row i) and filters are
+combined with C-level big-int AND/OR instead of an ORM query:
+
+* low-cardinality text columns and `ano` keep one bitmap per distinct value;
+* high-cardinality text columns keep sorted row positions per value and build
+  the bitmap on demand;
+* price ranges and the keyset cursor are contiguous bit ranges found by bisect.
+
+Other `sort_by` keys (ano, quilometragem) use positions presorted by (key, id):
+a page either walks them testing the filter bitmap, when matches are dense, or
+picks its rows from the matches with a bounded heap, when they are sparse.
+
+list_filters counts with filters (see mcp/facets.py) come from the same
+bitmaps: popcount of the filter AND each value's bitmap.
+
+Writes are picked up incrementally from the carros_alteracoes log: changed
+rows are re-read into a small overlay and their old positions are masked
+out. When the overlay grows past `max_overlay` a new snapshot is built in a
+background thread and swapped in.
+"""
+
+import bisect
+import heapq
+import logging
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from models import (
+    FAIXAS_PRECO, Veiculos, faixa_preco, ler_alteracoes, ler_versao, normalizar, podar_alteracoes,
+    ultima_alteracao
+)
+from .facets import add_count, facet_result, new_counts
+from .search import (
+    DEFAULT_MATCH, MATCH_MODES, TEXT_FILTERS, VEHICLE_FIELDS, SearchParamsError, encode_cursor,
+    parse_chunk_size, parse_fields, parse_filters, parse_page, parse_sort, serialize_vehicle, stream_chunks,
+    vehicle_select
+)
+
+logger = logging.getLogger(__name__)
+
+# dictionary-encoded columns; the ones in TEXT_FILTERS are also filterable
+TEXT_COLUMNS = ["marca", "modelo", "cor", "tp_combustivel", "tp_transmissao", "modelo_carro", "motorizacao"]
+BITMAP_MAX_CODES = 256  # above this a column keeps position lists instead of one bitmap per value
+SORT_COLUMNS = ("ano", "quilometragem")  # sort_by keys other than preco (the snapshot order itself)
+
+_NONZERO_BYTE = re.compile(rb"[^\x00]")
+_BITS_OF_BYTE = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+def _bitmap_from_positions(positions, size: int) -> int:
+    buf = bytearray((size + 7) // 8)
+    for pos in positions:
+        buf[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(buf, "little")
+
+
+def _range_mask(lo: int, hi: int) -> int:
+    # bits lo..hi-1 set
+    if hi <= lo:
+        return 0
+    return ((1 << hi) - 1) ^ ((1 << lo) - 1)
+
+
+def iter_bits(mask: int, size: int, reverse: bool = False) -> Iterator[int]:
+    """Positions of the set bits of `mask`, ascending (or descending); zero bytes are skipped in C."""
+    raw = mask.to_bytes((size + 7) // 8 or 1, "little")
+    if not reverse:
+        for match in _NONZERO_BYTE.finditer(raw):
+            base = match.start() << 3
+            for bit in _BITS_OF_BYTE[raw[match.start()]]:
+                yield base + bit
+        return
+    top = len(raw) - 1
+    for match in _NONZERO_BYTE.finditer(raw[::-1]):
+        index = top - match.start()
+        for bit in reversed(_BITS_OF_BYTE[raw[index]]):
+            yield (index << 3) + bit
+
+
+class _Column:
+    """Dictionary-encoded column: distinct values, one code per row and a per-value row index."""
+
+    def __init__(self, values: List[Any], codes: array, size: int, normalise: bool = True):
+        self.values = values
+        self.codes = codes
+        self.norm = [normalizar(v) if normalise and isinstance(v, str) else v for v in values]
+        self.size = size
+        if len(values) <= BITMAP_MAX_CODES:
+            self.bitmaps = self._build_bitmaps()
+            self.positions = None
+        else:
+            self.bitmaps = None
+            self.positions = [array("I") for _ in values]
+            for pos, code in enumerate(codes):
+                self.positions[code].append(pos)
+
+    def _build_bitmaps(self) -> List[int]:
+        # codes as one byte per row; translate() turns "row has code c" into '1'/'0' text and
+        # int(text, 2) packs it into a bitmap, both at C speed
+        if not self.size:
+            return [0 for _ in self.values]
+        as_bytes = array("B", self.codes).tobytes()
+        bitmaps = []
+        for code in range(len(self.values)):
+            table = bytes(0x31 if b == code else 0x30 for b in range(256))
+            bitmaps.append(int(as_bytes.translate(table)[::-1], 2))
+        return bitmaps
+
+    def mask_for(self, codes: List[int]) -> int:
+        mask = 0
+        for code in codes:
+            if self.bitmaps is not None:
+                mask |= self.bitmaps[code]
+            else:
+                mask |= _bitmap_from_positions(self.positions[code], self.size)
+        return mask
+
+    def counts(self, mask: int) -> List[Tuple[int, int]]:
+        # (code, rows of `mask` with that code) for the codes present in `mask`
+        if self.bitmaps is not None:
+            counts = ((code, (mask & bitmap).bit_count()) for code, bitmap in enumerate(self.bitmaps))
+            return [(code, count) for code, count in counts if count]
+        return list(Counter(self.codes[pos] for pos in iter_bits(mask, self.size)).items())
+
+    def codes_matching(self, value: str, mode: str) -> List[int]:
+        # dictionaries are small, so matching runs over distinct values, not rows
+        if mode == "exact":
+            return [c for c, v in enumerate(self.norm) if v == value]
+        if mode == "prefix":
+            return [c for c, v in enumerate(self.norm) if v is not None and v.startswith(value)]
+        return [c for c, v in enumerate(self.norm) if v is not None and value in v]
+
+
+class _Encoder:
+    """Builds a dictionary-encoded column one value at a time."""
+
+    def __init__(self):
+        self.dictionary: Dict[Any, int] = {}
+        self.codes = array("H")
+
+    def add(self, value):
+        code = self.dictionary.get(value)
+        if code is None:
+            code = self.dictionary[value] = len(self.dictionary)
+            if code == 1 << 16 and self.codes.typecode == "H":
+                self.codes = array("I", self.codes)
+        self.codes.append(code)
+
+    def column(self, size: int, normalise: bool = True) -> _Column:
+        return _Column(list(self.dictionary), self.codes, size, normalise)
+
+
+class _Snapshot:
+    """Immutable columnar image of carros, sorted by (preco, id)."""
+
+    def __init__(self, rows, seq: int):
+        # rows: iterable of tuples in VEHICLE_FIELDS order, already sorted by (preco, id)
+        self.seq = seq
+        self.ids = array("q")
+        self.preco = array("d")
+        self.ano = array("h")
+        self.quilometragem = array("q")
+        self.num_portas = array("b")
+        text = {name: _Encoder() for name in TEXT_COLUMNS}
+        anos, disponivel = _Encoder(), _Encoder()
+
+        for (vehicle_id, marca, modelo, ano, motorizacao, tp_combustivel, tp_transmissao,
+             num_portas, modelo_carro, cor, quilometragem, preco, disp) in rows:
+            self.ids.append(vehicle_id)
+            self.preco.append(preco)
+            self.ano.append(ano)
+            self.quilometragem.append(-1 if quilometragem is None else quilometragem)
+            self.num_portas.append(-1 if num_portas is None else num_portas)
+            text["marca"].add(marca)
+            text["modelo"].add(modelo)
+            text["cor"].add(cor)
+            text["tp_combustivel"].add(tp_combustivel)
+            text["tp_transmissao"].add(tp_transmissao)
+            text["modelo_carro"].add(modelo_carro)
+            text["motorizacao"].add(motorizacao)
+            anos.add(ano)
+            disponivel.add(bool(disp))
+
+        self.size = n = len(self.ids)
+        self.all_rows = (1 << n) - 1
+        self.text: Dict[str, _Column] = {name: enc.column(n) for name, enc in text.items()}
+        self.anos = anos.column(n, normalise=False)
+        self.disponivel = disponivel.column(n, normalise=False)
+
+        # id -> position, through ids sorted by id (a dict of a million ints would cost ~100 MB)
+        order = sorted(range(n), key=self.ids.__getitem__)
+        self.ids_sorted = array("q", (self.ids[i] for i in order))
+        self.pos_by_id = array("I", order)
+        # positions in (ano, id) and (quilometragem, id) order: a stable sort of the id-ordered
+        # positions by one column keeps ties in id order
+        self.sorted_by = {
+            name: array("I", sorted(self.pos_by_id, key=getattr(self, name).__getitem__)) for name in SORT_COLUMNS
+        }
+
+    def position_of(self, vehicle_id: int) -> Optional[int]:
+        i = bisect.bisect_left(self.ids_sorted, vehicle_id)
+        if i < len(self.ids_sorted) and self.ids_sorted[i] == vehicle_id:
+            return self.pos_by_id[i]
+        return None
+
+    def position_after(self, after: Tuple[float, int]) -> int:
+        # first position whose (preco, id) is greater than the cursor key
+        preco, vehicle_id = after
+        lo = bisect.bisect_left(self.preco, preco)
+        hi = bisect.bisect_right(self.preco, preco)
+        return bisect.bisect_right(self.ids, vehicle_id, lo, hi)
+
+    def position_before(self, after: Tuple[float, int]) -> int:
+        # first position whose (preco, id) is not smaller than the cursor key (descending pages)
+        preco, vehicle_id = after
+        lo = bisect.bisect_left(self.preco, preco)
+        hi = bisect.bisect_right(self.preco, preco)
+        return bisect.bisect_left(self.ids, vehicle_id, lo, hi)
+
+    def ordered(self, mask: int, sort_by: str, desc: bool, after: Optional[Tuple[Any, int]],
+                wanted: int) -> Iterator[Tuple[Any, int, int]]:
+        """(key, id, position) of the rows in `mask` in (sort_by, id) order, past the cursor.
+
+        Dense matches walk the presorted positions and test each against the mask; sparse ones
+        go through a heap that keeps the first `wanted` rows without sorting the rest.
+        """
+        values, ids = getattr(self, sort_by), self.ids
+        skip_null = sort_by == "quilometragem"  # -1 stands for NULL; such cars are not sorted by km
+        matches = mask.bit_count()
+        if not matches:
+            return iter(())
+
+        def past(key):
+            return after is None or (key < after if desc else key > after)
+
+        if wanted * self.size > matches * matches:  # walking would test more positions than there are matches
+            keyed = ((values[pos], ids[pos], pos) for pos in iter_bits(mask, self.size))
+            keyed = (item for item in keyed if not (skip_null and item[0] < 0) and past(item[:2]))
+            return iter((heapq.nlargest if desc else heapq.nsmallest)(wanted, keyed))
+
+        order = self.sorted_by[sort_by]
+        key = lambda pos: (values[pos], ids[pos])
+        if desc:
+            stop = len(order) if after is None else bisect.bisect_left(order, after, key=key)
+            positions = (order[i] for i in range(stop - 1, -1, -1))
+        else:
+            start = 0 if after is None else bisect.bisect_right(order, after, key=key)
+            positions = (order[i] for i in range(start, len(order)))
+        raw = mask.to_bytes((self.size + 7) // 8 or 1, "little")
+        return (
+            (values[pos], ids[pos], pos) for pos in positions
+            if raw[pos >> 3] >> (pos & 7) & 1 and not (skip_null and values[pos] < 0)
+        )
+
+    def row(self, pos: int) -> Dict[str, Any]:
+        text = self.text
+        km = self.quilometragem[pos]
+        portas = self.num_portas[pos]
+        return {
+            'id': self.ids[pos],
+            'marca': text["marca"].values[text["marca"].codes[pos]],
+            'modelo': text["modelo"].values[text["modelo"].codes[pos]],
+            'ano': self.ano[pos],
+            'motorizacao': text["motorizacao"].values[text["motorizacao"].codes[pos]],
+            'tp_combustivel': text["tp_combustivel"].values[text["tp_combustivel"].codes[pos]],
+            'tp_transmissao': text["tp_transmissao"].values[text["tp_transmissao"].codes[pos]],
+            'num_portas': None if portas < 0 else portas,
+            'modelo_carro': text["modelo_carro"].values[text["modelo_carro"].codes[pos]],
+            'cor': text["cor"].values[text["cor"].codes[pos]],
+            'quilometragem': None if km < 0 else km,
+            'preco': self.preco[pos],
+            'disponivel': self.disponivel.values[self.disponivel.codes[pos]],
+        }
+
+
+class _Filters:
+    """search_vehicles params parsed once, applied both as bitmaps and to overlay rows."""
+
+    def __init__(self, params: Dict[str, Any]):
+        self.match = params.get("match", DEFAULT_MATCH)
+        if self.match not in MATCH_MODES:
+            raise SearchParamsError(f"'match' must be one of {', '.join(MATCH_MODES)}")
+        if params.get("text"):
+            raise SearchParamsError("'text' searches use the FTS index: run them through SQL")
+        self.text = []
+        for campo in TEXT_FILTERS:
+            value = params.get(campo)
+            if value and normalizar(value):
+                self.text.append((campo, normalizar(value)))
+        self.ano_min, self.ano_max, self.preco_min, self.preco_max, self.disponivel = parse_filters(params)
+
+    def _text_matches(self, value: Optional[str], wanted: str) -> bool:
+        norm = normalizar(value)
+        if norm is None:
+            return False
+        if self.match == "exact":
+            return norm == wanted
+        if self.match == "prefix":
+            return norm.startswith(wanted)
+        return wanted in norm
+
+    def matches(self, row: Dict[str, Any]) -> bool:
+        for campo, wanted in self.text:
+            if not self._text_matches(row[campo], wanted):
+                return False
+        if self.ano_min is not None and row['ano'] < self.ano_min:
+            return False
+        if self.ano_max is not None and row['ano'] > self.ano_max:
+            return False
+        if self.preco_min is not None and row['preco'] < self.preco_min:
+            return False
+        if self.preco_max is not None and row['preco'] > self.preco_max:
+            return False
+        if self.disponivel is not None and bool(row['disponivel']) != self.disponivel:
+            return False
+        return True
+
+    def mask(self, snap: _Snapshot) -> int:
+        mask = snap.all_rows
+        for campo, wanted in self.text:
+            column = snap.text[campo]
+            mask &= column.mask_for(column.codes_matching(wanted, self.match))
+            if not mask:
+                return 0
+        if self.ano_min is not None or self.ano_max is not None:
+            lo = self.ano_min if self.ano_min is not None else -10**9
+            hi = self.ano_max if self.ano_max is not None else 10**9
+            anos = snap.anos
+            mask &= anos.mask_for([c for c, ano in enumerate(anos.values) if lo <= ano <= hi])
+        if self.disponivel is not None:
+            disp = snap.disponivel
+            mask &= disp.mask_for([c for c, v in enumerate(disp.values) if v == self.disponivel])
+        if self.preco_min is not None or self.preco_max is not None:
+            lo = 0 if self.preco_min is None else bisect.bisect_left(snap.preco, self.preco_min)
+            hi = snap.size if self.preco_max is None else bisect.bisect_right(snap.preco, self.preco_max)
+            mask &= _range_mask(lo, hi)
+        return mask
+
+
+class ColumnarInventory:
+    """Columnar search engine over carros; answers search_vehicles without touching SQLite."""
+
+    def __init__(self, engine, max_overlay: int = 50_000, background_rebuild: bool = True, write_engine=None):
+        self.engine = engine
+        self.write_engine = write_engine or engine  # prunes the change log; `engine` may be read-only
+        self.max_overlay = max_overlay
+        self.background_rebuild = background_rebuild
+        self._lock = threading.RLock()
+        self._overlay: Dict[int, Optional[Dict[str, Any]]] = {}  # id -> current row (None = deleted)
+        self._tombstones = 0  # snapshot positions superseded by the overlay
+        self._seq = 0
+        self._version: Optional[int] = None
+        self._rebuilding = False
+        self._snapshot = self._build_snapshot()
+        self._seq = self._snapshot.seq
+
+    # --- loading -----------------------------------------------------------
+
+    def _build_snapshot(self) -> _Snapshot:
+        started = time.perf_counter()
+        with self.engine.connect() as conn:
+            seq = ultima_alteracao(conn)
+            stmt = vehicle_select().order_by(Veiculos.preco, Veiculos.id)
+            rows = conn.execute(stmt.execution_options(yield_per=10_000))
+            snapshot = _Snapshot(rows, seq)
+        logger.info(f"Columnar snapshot: {snapshot.size} rows in {time.perf_counter() - started:.2f}s")
+        return snapshot
+
+    def _rebuild(self):
+        try:
+            snapshot = self._build_snapshot()
+            with self.write_engine.begin() as conn:
+                podar_alteracoes(conn)
+            with self._lock:
+                # rows read after `seq` are replayed from the log again; replay is idempotent
+                self._snapshot = snapshot
+                self._seq = snapshot.seq
+                self._overlay = {}
+                self._tombstones = 0
+                self._version = None
+        except Exception:
+            logger.exception("Columnar rebuild failed")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _schedule_rebuild(self):
+        # caller holds the lock
+        if self._rebuilding:
+            return
+        self._rebuilding = True
+        if self.background_rebuild:
+            threading.Thread(target=self._rebuild, daemon=True, name="mcp-columnar-rebuild").start()
+        else:
+            self._rebuild()
+
+    def facets(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """list_filters counts over the cars matching `params`; same result shape as facets.facets_sql."""
+        filters = _Filters(params)
+        self.refresh()
+        with self._lock:
+            snap, overlay, tombstones = self._snapshot, self._overlay, self._tombstones
+
+        mask = filters.mask(snap) & ~tombstones
+        counts = new_counts()
+        for campo in TEXT_FILTERS:
+            column = snap.text[campo]
+            for code, count in column.counts(mask):
+                if column.norm[code] is not None:
+                    add_count(counts, campo, column.norm[code], column.values[code], count)
+        for campo, column in (("ano", snap.anos), ("disponivel", snap.disponivel)):
+            for code, count in column.counts(mask):
+                add_count(counts, campo, column.values[code], column.values[code], count)
+        # rows are sorted by preco, so each price range is a contiguous run of positions
+        bounds = [0] + [bisect.bisect_left(snap.preco, limite) for limite in FAIXAS_PRECO[1:]] + [snap.size]
+        for i, limite in enumerate(FAIXAS_PRECO):
+            add_count(counts, "preco", limite, limite, (mask & _range_mask(bounds[i], bounds[i + 1])).bit_count())
+
+        precos = [snap.preco[(mask & -mask).bit_length() - 1], snap.preco[mask.bit_length() - 1]] if mask else []
+        for row in overlay.values():
+            if row is None or not filters.matches(row):
+                continue
+            for campo in TEXT_FILTERS:
+                if row[campo] is not None:
+                    add_count(counts, campo, normalizar(row[campo]), row[campo], 1)
+            add_count(counts, "ano", row['ano'], row['ano'], 1)
+            add_count(counts, "disponivel", bool(row['disponivel']), bool(row['disponivel']), 1)
+            add_count(counts, "preco", faixa_preco(row['preco']), faixa_preco(row['preco']), 1)
+            precos.append(row['preco'])
+        return facet_result(counts, min(precos, default=None), max(precos, default=None))
+
+    def refresh(self):
+        """Apply writes logged since the last refresh; cheap when nothing changed."""
+        with self._lock, self.engine.connect() as conn:
+            version = ler_versao(conn)
+            if version == self._version:
+                return
+            changes = ler_alteracoes(conn, self._seq)
+            # seqs are consecutive, so a gap after the one we stopped at was pruned away
+            pruned = bool(changes) and changes[0][0] > self._seq + 1
+            full_reload = pruned or any(carro_id is None for _, carro_id in changes)
+            changed = {carro_id for _, carro_id in changes if carro_id is not None}
+
+            if full_reload or len(self._overlay) + len(changed) > self.max_overlay:
+                self._schedule_rebuild()
+                if full_reload or not self.background_rebuild:
+                    return  # a fresh snapshot replaces the overlay (or will, once built)
+
+            if changed:
+                self._apply_changes(conn, changed)
+            if changes:
+                self._seq = changes[-1][0]
+            self._version = version
+
+    def _apply_changes(self, conn, changed):
+        found = {}
+        ids = list(changed)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for row in conn.execute(vehicle_select().where(Veiculos.id.in_(chunk))):
+                found[row.id] = serialize_vehicle(row)
+
+        positions = []
+        for vehicle_id in changed:
+            self._overlay[vehicle_id] = found.get(vehicle_id)
+            pos = self._snapshot.position_of(vehicle_id)
+            if pos is not None:
+                positions.append(pos)
+        if positions:
+            self._tombstones |= _bitmap_from_positions(positions, self._snapshot.size)
+
+    # --- querying ----------------------------------------------------------
+
+    @property
+    def version(self) -> Optional[int]:
+        """Inventory version (models.ler_versao) the rows served now reflect; None until the next refresh.
+
+        Lags behind ler_versao while a full rebuild is pending: the old snapshot keeps answering.
+        """
+        with self._lock:
+            return self._version
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rows": self._snapshot.size,
+                "overlay": len(self._overlay),
+                "seq": self._seq,
+                "rebuilding": self._rebuilding,
+            }
+
+    def _matches(self, filters: "_Filters", after: Optional[Tuple[Any, int]], offset: int = 0,
+                 sort: Tuple[str, str] = ("preco", "asc"), wanted: int = 0) -> Iterator[Dict[str, Any]]:
+        # matching rows after the cursor in sort order; dicts are only built past `offset`.
+        # `wanted`: how many rows the caller reads at most (offset included)
+        self.refresh()
+        with self._lock:
+            snap, overlay, tombstones = self._snapshot, self._overlay, self._tombstones
+        sort_by, order = sort
+        desc = order == "desc"
+
+        mask = filters.mask(snap) & ~tombstones
+        if sort_by == "preco":
+            if after is not None and desc:
+                mask &= (1 << snap.position_before(after)) - 1
+            elif after is not None:
+                mask &= ~((1 << snap.position_after(after)) - 1)
+            base = ((snap.preco[pos], snap.ids[pos], pos) for pos in iter_bits(mask, snap.size, reverse=desc))
+        else:
+            base = snap.ordered(mask, sort_by, desc, after, wanted)
+
+        extra = sorted(
+            (
+                (row[sort_by], row['id'], row) for row in overlay.values()
+                if row is not None and row[sort_by] is not None and filters.matches(row)
+                and (after is None or ((row[sort_by], row['id']) < after if desc else (row[sort_by], row['id']) > after))
+            ),
+            key=lambda t: (t[0], t[1]), reverse=desc,
+        )
+        merged = heapq.merge(base, extra, key=lambda t: (t[0], t[1]), reverse=desc)
+        for _, _, item in islice(merged, offset, None):
+            yield snap.row(item) if isinstance(item, int) else item
+
+    def search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Same params and result shape as the SQL search_vehicles path."""
+        limit, offset, after = parse_page(params)
+        fields = parse_fields(params)
+        filters = _Filters(params)
+        sort = parse_sort(params)
+
+        page = list(islice(self._matches(filters, after, offset, sort, offset + limit + 1), limit + 1))
+        has_more = len(page) > limit
+        results = page[:limit]
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_cursor(results[-1][sort[0]], results[-1]['id'], sort)
+        return {"results": _project(results, fields), "count": len(results), "next_cursor": next_cursor}
+
+    def stream(self, params: Dict[str, Any], emit) -> Dict[str, Any]:
+        """Same as search.stream_sql: results go to `emit` in chunks, rows are built as they are sent."""
+        limit, offset, after = parse_page(params)
+        fields = parse_fields(params)
+        chunk_size = parse_chunk_size(params)
+        filters = _Filters(params)
+        sort = parse_sort(params)
+
+        rows = self._matches(filters, after, offset, sort, offset + limit + 1)
+        return stream_chunks(
+            rows, limit, chunk_size, emit,
+            lambda chunk: _project(chunk, fields),
+            lambda row: encode_cursor(row[sort[0]], row['id'], sort),
+        )
+
+
+def _project(rows: List[Dict[str, Any]], fields: List[str]) -> List[Dict[str, Any]]:
+    if fields is VEHICLE_FIELDS:
+        return rows
+    return [{name: row[name] for name in fields} for row in rows]
@@ -0,0 +1,156 @@
+"""
+Facet counts for list_filters: how many cars have each marca, modelo, combustivel, transmissao,
+cor, category, year, price range and availability.
+
+Without filters the counts are read from carros_facetas, which triggers keep up to date on every
+write (see models.CAMPOS_FACETAS), so no request groups the whole table. With filters (the same
+ones search_vehicles takes, `text` included) only the matching cars are counted, in one pass over
+them here, or from the bitmaps in ColumnarInventory.facets.
+"""
+
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, literal_column, select
+
+from models import CAMPOS_FACETAS, CAMPOS_NORMALIZADOS, FAIXAS_PRECO, Veiculos, faixa_preco_sql, ler_facetas
+from .search import BUSCA, TEXT_FILTERS, _FTS_MATCH, apply_filters, resolve_text
+
+# result key -> carros_facetas campo (the keys of message_type.AvailableFilters)
+FACETS = {
+    "marcas": "marca",
+    "modelos": "modelo",
+    "combustiveis": "tp_combustivel",
+    "transmissoes": "tp_transmissao",
+    "cores": "cor",
+    "tipos_carro": "modelo_carro",
+    "anos": "ano",
+    "faixas_preco": "preco",
+    "disponiveis": "disponivel",
+}
+SCOPE_PARAMS = TEXT_FILTERS + ["text", "ano_min", "ano_max", "preco_min", "preco_max", "disponivel"]
+
+Counts = Dict[str, Dict[Any, List]]  # campo -> value -> [label, count]
+
+
+def is_scoped(params: Dict[str, Any]) -> bool:
+    """True when params carry a filter, so the counts cannot come straight from carros_facetas."""
+    return any(params.get(name) is not None and params.get(name) != "" for name in SCOPE_PARAMS)
+
+
+def new_counts() -> Counts:
+    return {campo: {} for campo in CAMPOS_FACETAS}
+
+
+def add_count(counts: Counts, campo: str, value: Any, label: Any, count: int):
+    # text values are normalised, so "Toyota" and "TOYOTA" add up; the smallest label is kept, as
+    # MIN(rotulo) does in SQL
+    entry = counts[campo].get(value)
+    if entry is None:
+        counts[campo][value] = [label, count]
+    else:
+        entry[0] = min(entry[0], label)
+        entry[1] += count
+
+
+def _price_range(lower: int) -> Dict[str, Any]:
+    i = FAIXAS_PRECO.index(lower)
+    return {"min": lower, "max": FAIXAS_PRECO[i + 1] if i + 1 < len(FAIXAS_PRECO) else None}
+
+
+def facet_result(counts: Counts, preco_min: Optional[float], preco_max: Optional[float]) -> Dict[str, Any]:
+    """The list_filters result: values by count (years newest first, price ranges ascending)."""
+    result: Dict[str, Any] = {}
+    for key, campo in FACETS.items():
+        items = [(value, label, count) for value, (label, count) in counts[campo].items() if count > 0]
+        if campo == "preco":
+            result[key] = [{**_price_range(value), "count": count} for value, _, count in sorted(items)]
+        elif campo in ("ano", "disponivel"):
+            result[key] = [{"value": value, "count": count} for value, _, count in sorted(items, reverse=True)]
+        else:
+            items.sort(key=lambda item: (-item[2], item[1]))
+            result[key] = [{"value": label, "count": count} for _, label, count in items]
+    result["total"] = sum(item["count"] for item in result["faixas_preco"])  # every car has a preco
+    anos = [item["value"] for item in result["anos"]]
+    result["ano_min"], result["ano_max"] = (min(anos), max(anos)) if anos else (None, None)
+    result["preco_min"], result["preco_max"] = preco_min, preco_max
+    return result
+
+
+def _typed(campo: str, value: str) -> Any:
+    # carros_facetas keeps every value as text
+    if campo in ("ano", "preco"):
+        return int(float(value))
+    if campo == "disponivel":
+        return value == "1"
+    return value
+
+
+def facets_from_table(conn) -> Dict[str, Any]:
+    """Counts over the whole inventory, from carros_facetas."""
+    counts = new_counts()
+    for campo, value, label, count in ler_facetas(conn):
+        if campo in counts:
+            add_count(counts, campo, _typed(campo, value), label, count)
+    # two subqueries: SQLite reads MIN and MAX from the ends of ix_carros_preco only one per SELECT
+    preco_min, preco_max = conn.exec_driver_sql(
+        "SELECT (SELECT MIN(preco) FROM carros), (SELECT MAX(preco) FROM carros)"
+    ).one()
+    return facet_result(counts, preco_min, preco_max)
+
+
+def _facet_columns():
+    # campo -> (value, label) columns, as in models.CAMPOS_FACETAS; label None when it is the value
+    columns = {
+        campo: (getattr(Veiculos, campo_norm), getattr(Veiculos, campo))
+        for campo, campo_norm in CAMPOS_NORMALIZADOS.items()
+    }
+    columns["ano"] = (Veiculos.ano, None)
+    columns["preco"] = (literal_column(faixa_preco_sql("carros.preco")), None)
+    columns["disponivel"] = (Veiculos.disponivel, None)
+    return columns
+
+
+def facets_sql(session, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Counts over the cars matching `params`, in one pass over them.
+
+    Each matching row is reduced to its facet values, and the combinations are counted in Python:
+    SQLite sorts for every GROUP BY, and grouping carros per facet lets it walk the grouped column's
+    index over the whole table. Memory grows with the distinct combinations, not with the rows.
+    """
+    match = resolve_text(session, params)
+
+    def scoped(stmt):
+        stmt = apply_filters(stmt.select_from(Veiculos), params)
+        if match is not None:
+            stmt = stmt.join(BUSCA, BUSCA.c.rowid == Veiculos.id).where(_FTS_MATCH(match))
+        return stmt
+
+    selected, slots = [], []  # slots: (campo, value index, label index)
+    for campo, (value, label) in _facet_columns().items():
+        selected.append(value)
+        if label is not None:
+            selected.append(label)
+        slots.append((campo, len(selected) - (2 if label is not None else 1), len(selected) - 1))
+    # rows go straight from the DBAPI cursor into the Counter: building a Result row per car costs
+    # more than the query itself
+    compiled = scoped(select(*selected)).compile(dialect=session.bind.dialect)
+    bound = compiled.construct_params()
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.execute(str(compiled), [bound[name] for name in compiled.positiontup])
+        combinations = Counter(cursor)
+    finally:
+        cursor.close()
+
+    counts = new_counts()
+    for combination, count in combinations.items():
+        for campo, value_at, label_at in slots:
+            value, label = combination[value_at], combination[label_at]
+            if value is None:
+                continue
+            if campo == "disponivel":  # raw cursor: 0 / 1
+                value = label = bool(value)
+            add_count(counts, campo, value, label, count)
+    preco_min, preco_max = session.execute(scoped(select(func.min(Veiculos.preco), func.max(Veiculos.preco)))).one()
+    return facet_result(counts, preco_min, preco_max)
@@ -144,17 +144,31 @@ class HealthResponse(BaseModel):
     server_version: str = "1.0.0"
 
 
-#FILTERS AVAILABLE 
+#FILTERS AVAILABLE (result of list_filters: how many cars have each value)
+class FacetCount(BaseModel):
+    value: Any
+    count: int
+
+class PriceRange(BaseModel):
+    min: float
+    max: Optional[float] = None  # last range has no upper bound
+    count: int
+
 class AvailableFilters(BaseModel):
-    marcas: List[str] = Field(default_factory=lambda: MARCAS_DISPONIVEIS)
-    combustiveis: List[str] = Field(default_factory=lambda: [e.value for e in TipoCombustivel])
-    transmissoes: List[str] = Field(default_factory=lambda: [e.value for e in TipoTransmissao])
-    cores: List[str] = Field(default_factory=lambda: [e.value for e in Cores])
-    tipos_carro: List[str] = Field(default_factory=lambda: [e.value for e in ModeloCarro])
-    ano_min: int = 2005
-    ano_max: int = 2025
-    preco_min: float = 3000.0  
-    preco_max: float = 3000000.0
+    total: int = 0
+    marcas: List[FacetCount] = Field(default_factory=list)
+    modelos: List[FacetCount] = Field(default_factory=list)
+    combustiveis: List[FacetCount] = Field(default_factory=list)
+    transmissoes: List[FacetCount] = Field(default_factory=list)
+    cores: List[FacetCount] = Field(default_factory=list)
+    tipos_carro: List[FacetCount] = Field(default_factory=list)
+    anos: List[FacetCount] = Field(default_factory=list)
+    faixas_preco: List[PriceRange] = Field(default_factory=list)
+    disponiveis: List[FacetCount] = Field(default_factory=list)
+    ano_min: Optional[int] = None
+    ano_max: Optional[int] = None
+    preco_min: Optional[float] = None
+    preco_max: Optional[float] = None
 
 def validate_filters(filtros: VehicleSearchRequest) -> List[str]:
     errors = []
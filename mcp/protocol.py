@@ -4,10 +4,18 @@ Inspired im JSON-RPC 2.0 protocol
 
 import json
 import logging
+import socket
+import struct
+import time
 from enum import Enum
-from typing import Any, Dict, Optional
-from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 import uuid
+import zlib
+
+try:
+    import msgpack  # optional: enables the "msgpack" codec
+except ImportError:
+    msgpack = None
 
 # basic logger setup
 logger = logging.getLogger(__name__)
@@ -26,8 +34,15 @@ class MCPMethod(Enum):
     # Operations supported by MCP
     SEARCH_VEHICLES = "search_vehicles"
     GET_VEHICLE = "get_vehicle"
+    GET_VEHICLES = "get_vehicles"
     HEALTH_CHECK = "health_check"
     LIST_FILTERS = "list_filters"
+    SIMILAR_VEHICLES = "similar_vehicles"
+    NEGOTIATE = "negotiate"
+    SEARCH_CHUNK = "search_chunk"  # server -> client notification carrying part of a streamed search
+
+_METHODS = {method.value: method for method in MCPMethod}  # faster than MCPMethod(value) when parsing
+
 
 class MCPErrorCode(Enum):
     # Error codes based on JSON-RPC 
@@ -70,9 +85,28 @@ class MCPError:
         return f"MCPError({self.code}: {self.message})"
 
 
+_second_prefix = (None, "")  # (epoch second, "YYYY-MM-DDTHH:MM:SS") of the last timestamp formatted
+
+
+def _format_timestamp(ns: int) -> str:
+    # naive UTC ISO timestamp with microseconds, like datetime.utcnow().isoformat();
+    # the date part is formatted once per second
+    global _second_prefix
+    second, rest = divmod(ns, 1_000_000_000)
+    cached_second, prefix = _second_prefix
+    if cached_second != second:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        _second_prefix = (second, prefix)
+    return f"{prefix}.{rest // 1000:06d}"
+
+
     # Base  for all MCP protocol messages
 
 class MCPMessage:
+    # __slots__ and lazy fields keep the per-message cost low: the uuid is only generated when
+    # the id is read (notifications never need one) and the timestamp is only formatted when
+    # the message is serialised (parsed requests never need one)
+    __slots__ = ("message_type", "method", "params", "result", "error", "_message_id", "_created", "_timestamp")
 
     def __init__(
         self,
@@ -88,11 +122,44 @@ class MCPMessage:
         self.params = params or {}
         self.result = result
         self.error = error
-        self.message_id = message_id or str(uuid.uuid4())
-        self.timestamp = datetime.utcnow().isoformat()
+        self._message_id = message_id
+        self._created = time.time_ns()
+        self._timestamp = None
 
         self._validate()
 
+    @classmethod
+    def _trusted(cls, message_type: MCPMessageType, method: Optional[MCPMethod] = None,
+                 params: Optional[Dict[str, Any]] = None, result: Any = None,
+                 error: Optional[Dict[str, Any]] = None, message_id: Optional[str] = None) -> 'MCPMessage':
+        # build a message without _validate, for messages this package assembles itself
+        msg = object.__new__(cls)
+        msg.message_type = message_type
+        msg.method = method
+        msg.params = params or {}
+        msg.result = result
+        msg.error = error
+        msg._message_id = message_id
+        msg._created = time.time_ns()
+        msg._timestamp = None
+        return msg
+
+    @property
+    def message_id(self) -> str:
+        if self._message_id is None:
+            self._message_id = str(uuid.uuid4())
+        return self._message_id
+
+    @message_id.setter
+    def message_id(self, value: Optional[str]):
+        self._message_id = value
+
+    @property
+    def timestamp(self) -> str:
+        if self._timestamp is None:
+            self._timestamp = _format_timestamp(self._created)
+        return self._timestamp
+
 
         # basic message validation rules
     def _validate(self):
@@ -106,59 +173,67 @@ class MCPMessage:
                 raise ValueError("Response cannot have both result and error")
 
     def to_dict(self) -> Dict[str, Any]:
+        mtype = self.message_type
+        if mtype is MCPMessageType.NOTIFICATION:
+            # notifications carry no id
+            return {"jsonrpc": "2.0", "timestamp": self.timestamp, "method": self.method.value, "params": self.params}
+
         msg = {
             "jsonrpc": "2.0",
             "id": self.message_id,
             "timestamp": self.timestamp
         }
 
-        if self.message_type == MCPMessageType.REQUEST:
-            msg.update({"method": self.method.value, "params": self.params})
-        elif self.message_type == MCPMessageType.RESPONSE:
+        if mtype is MCPMessageType.REQUEST:
+            msg["method"] = self.method.value
+            msg["params"] = self.params
+        elif mtype is MCPMessageType.RESPONSE:
             if self.error:
                 msg["error"] = self.error
             else:
                 msg["result"] = self.result
-        elif self.message_type == MCPMessageType.NOTIFICATION:
-            msg.update({"method": self.method.value, "params": self.params})
-            msg.pop("id", None)
-        elif self.message_type == MCPMessageType.ERROR:
+        elif mtype is MCPMessageType.ERROR:
             msg["error"] = self.error
 
         return msg
 
     def to_json(self) -> str:
-        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
 
     @classmethod
     def from_json(cls, json_str: str) -> 'MCPMessage':
         try:
             data = json.loads(json_str)
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to decode JSON: {e}")
+            raise ValueError(f"Invalid JSON: {e}")
+        return cls.from_dict(data)
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], trusted: bool = False) -> 'MCPMessage':
+        # build a message from an already decoded JSON object (e.g. one entry of a batch);
+        # trusted=True skips _validate, for traffic produced by this package
+        try:
             if not isinstance(data, dict):
                 raise ValueError("Message must be a JSON object")
-            # figure out the type of message 
-            if "method" in data and "id" in data:
-                mtype = MCPMessageType.REQUEST
-                method = MCPMethod(data["method"])
-            elif "result" in data and "id" in data:
-                mtype = MCPMessageType.RESPONSE
-                method = None
-            elif "error" in data and "id" in data:
+            # figure out the type of message
+            has_id = "id" in data
+            if "method" in data:
+                name = data["method"]
+                method = _METHODS.get(name) if isinstance(name, str) else None
+                if method is None:
+                    raise ValueError(f"{name!r} is not a valid MCPMethod")
+                mtype = MCPMessageType.REQUEST if has_id else MCPMessageType.NOTIFICATION
+            elif has_id and ("result" in data or "error" in data):
                 mtype = MCPMessageType.RESPONSE
                 method = None
-            elif "method" in data and "id" not in data:
-                mtype = MCPMessageType.NOTIFICATION
-                method = MCPMethod(data["method"])
             else:
                 mtype = MCPMessageType.ERROR
                 method = None
-            error_data = data.get("error")
-            err = error_data if error_data else None
-
+            err = data.get("error") or None
 
-
-            return cls(
+            build = cls._trusted if trusted else cls
+            return build(
                 message_type=mtype,
                 method=method,
                 params=data.get("params"),
@@ -167,12 +242,6 @@ class MCPMessage:
                 message_id=data.get("id")
             )
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to decode JSON: {e}")
-            raise ValueError(f"Invalid JSON: {e}")
-        except KeyError as e:
-            logger.error(f"Missing field: {e}")
-            raise ValueError(f"Malformed message: missing {e}")
         except ValueError as e:
             logger.error(f"Invalid value in message: {e}")
             raise ValueError(f"Invalid message: {e}")
@@ -199,6 +268,8 @@ class MCPMessage:
 
     # request message
 class MCPRequest(MCPMessage):
+    __slots__ = ()
+
     def __init__(self, method: MCPMethod, params: Optional[Dict[str, Any]] = None):
         super().__init__(
             message_type=MCPMessageType.REQUEST, method=method, params=params or {}
@@ -206,6 +277,8 @@ class MCPRequest(MCPMessage):
 
     # response message
 class MCPResponse(MCPMessage):
+    __slots__ = ()
+
     def __init__(self, request: MCPMessage, result: Optional[Any] = None, error: Optional[MCPError] = None):
         err_dict = error.to_dict() if error else None
         super().__init__(
@@ -217,6 +290,8 @@ class MCPResponse(MCPMessage):
 
 class MCPNotification(MCPMessage):
     # notification message
+    __slots__ = ()
+
     def __init__(self, method: MCPMethod, params: Optional[Dict[str, Any]] = None):
         super().__init__(
             message_type=MCPMessageType.NOTIFICATION,
@@ -228,10 +303,197 @@ class MCPNotification(MCPMessage):
 def create_error_response(request: MCPMessage, error_code: MCPErrorCode, message: str, data: Any = None) -> MCPResponse:
     # create an error response
     err = MCPError(error_code.value, message, data)
-    return MCPResponse(request, error=err)
+    return MCPResponse._trusted(MCPMessageType.RESPONSE, error=err.to_dict(), message_id=request.message_id)
+def create_error_for_id(message_id: Optional[str], error_code: MCPErrorCode, message: str, data: Any = None) -> MCPMessage:
+    # error response when only the request id is known (request could not be parsed)
+    err = MCPError(error_code.value, message, data)
+    return MCPResponse._trusted(MCPMessageType.RESPONSE, error=err.to_dict(), message_id=message_id or "error")
 def create_success_response(request: MCPMessage, result: Any) -> MCPResponse:
     # create a success response
-    return MCPResponse(request, result=result)
+    return MCPResponse._trusted(MCPMessageType.RESPONSE, result=result, message_id=request.message_id)
+def create_notification(method: MCPMethod, params: Dict[str, Any]) -> MCPNotification:
+    # server -> client notification (e.g. SEARCH_CHUNK)
+    return MCPNotification._trusted(MCPMessageType.NOTIFICATION, method=method, params=params)
+
+
+# CODECS
+# How a message is turned into frame bytes. Every connection starts with JSON; a NEGOTIATE
+# request switches the server's replies to another codec and/or the "rows" result layout.
+# Each frame carries its codec id in the header, so frames in flight during the switch
+# are still decoded correctly.
+
+class JSONCodec:
+    name = "json"
+    codec_id = 0
+
+    def encode(self, obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    codec_id = 1
+
+    def encode(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def decode(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+JSON_CODEC = JSONCodec()
+CODECS: Dict[str, Any] = {}          # name -> codec, in order of preference
+_CODECS_BY_ID: Dict[int, Any] = {}
+
+
+def register_codec(codec) -> None:
+    # a codec is any object with name, codec_id (0-7), encode(obj) -> bytes and decode(bytes) -> obj
+    if not 0 <= codec.codec_id <= FRAME_CODEC_MAX:
+        raise ValueError(f"codec_id must be between 0 and {FRAME_CODEC_MAX}")
+    CODECS[codec.name] = codec
+    _CODECS_BY_ID[codec.codec_id] = codec
+
+
+def get_codec(name: str):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported codec: {name} (available: {', '.join(CODECS)})")
+
+
+def codec_for_id(codec_id: int):
+    try:
+        return _CODECS_BY_ID[codec_id]
+    except KeyError:
+        raise ValueError(f"Unsupported codec id: {codec_id}")
+
+
+# result layouts: "objects" sends each vehicle as a dict; "rows" sends the field names once
+# and each vehicle as a list of values
+LAYOUTS = ("objects", "rows")
+
+
+def pack_rows(result: Dict[str, Any]) -> Dict[str, Any]:
+    """{"results": [dict, ...]} -> {"fields": [...], "rows": [[...], ...]}; other keys are kept."""
+    vehicles = result.get("results")
+    if not isinstance(vehicles, list):
+        return result
+    packed = {key: value for key, value in result.items() if key != "results"}
+    fields = list(vehicles[0]) if vehicles else []
+    packed["fields"] = fields
+    packed["rows"] = [[vehicle.get(name) for name in fields] for vehicle in vehicles]
+    return packed
+
+
+def unpack_rows(result: Dict[str, Any]) -> Dict[str, Any]:
+    # inverse of pack_rows, for callers that want dicts back
+    if "rows" not in result:
+        return result
+    fields = result["fields"]
+    unpacked = {key: value for key, value in result.items() if key not in ("fields", "rows")}
+    unpacked["results"] = [dict(zip(fields, row)) for row in result["rows"]]
+    return unpacked
+
+
+# FRAMING
+# Every message on the wire is a 4-byte big-endian header followed by the encoded payload,
+# so the receiver knows exactly how many bytes to read and parses each message once.
+# The header holds the payload length in its low 28 bits, the codec id in bits 28-30 and,
+# in bit 31, whether the payload is zlib-compressed. Plain JSON frames are just the length.
+FRAME_HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+MAX_BATCH_SIZE = 100  # requests per JSON-RPC batch (the server's default max_batch_size)
+FRAME_SIZE_MASK = (1 << 28) - 1
+FRAME_CODEC_SHIFT = 28
+FRAME_CODEC_MAX = 7
+FRAME_COMPRESSED = 1 << 31
+
+# compression is negotiated (NEGOTIATE "compression"); payloads smaller than the threshold
+# are sent as they are, compressing them would cost more than it saves
+COMPRESSIONS = ("zlib",)
+COMPRESS_THRESHOLD = 1024
+COMPRESS_LEVEL = 1  # fastest level: most of the gain on repetitive JSON for a fraction of the CPU
+
+
+def encode_frame(payload: bytes, codec_id: int = 0, compress_threshold: Optional[int] = None) -> bytes:
+    # prefix a payload with its length, codec id and compression flag
+    flags = codec_id << FRAME_CODEC_SHIFT
+    if compress_threshold is not None and len(payload) >= compress_threshold:
+        compressed = zlib.compress(payload, COMPRESS_LEVEL)
+        if len(compressed) < len(payload):
+            payload = compressed
+            flags |= FRAME_COMPRESSED
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame too large: {len(payload)} bytes (max {MAX_FRAME_SIZE})")
+    return FRAME_HEADER.pack(len(payload) | flags) + payload
+
+
+def decode_header(header: bytes) -> Tuple[int, int, bool]:
+    """(codec_id, payload size, compressed) of a frame header."""
+    (word,) = FRAME_HEADER.unpack(header)
+    size = word & FRAME_SIZE_MASK
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame too large: {size} bytes (max {MAX_FRAME_SIZE})")
+    return (word >> FRAME_CODEC_SHIFT) & FRAME_CODEC_MAX, size, bool(word & FRAME_COMPRESSED)
+
+
+def decompress_payload(payload: bytes) -> bytes:
+    # inflate a compressed frame, refusing to grow past MAX_FRAME_SIZE
+    inflater = zlib.decompressobj()
+    try:
+        data = inflater.decompress(payload, MAX_FRAME_SIZE)
+    except zlib.error as e:
+        raise ValueError(f"Invalid compressed frame: {e}")
+    if inflater.unconsumed_tail:
+        raise ValueError(f"Decompressed frame larger than {MAX_FRAME_SIZE} bytes")
+    return data
+
+
+def send_frame(sock: socket.socket, payload: bytes, codec_id: int = 0,
+               compress_threshold: Optional[int] = None) -> None:
+    sock.sendall(encode_frame(payload, codec_id, compress_threshold))
+
+
+def recv_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    # read exactly `size` bytes into a preallocated buffer; None if the peer closed before any byte
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            if received == 0:
+                return None
+            raise ConnectionError(f"Connection closed mid-frame ({received}/{size} bytes)")
+        received += n
+    return bytes(buf)
+
+
+def recv_frame(sock: socket.socket) -> Optional[Tuple[int, bytes]]:
+    # read one frame as (codec_id, payload); None on clean end of stream
+    header = recv_exactly(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    codec_id, size, compressed = decode_header(header)
+    if size == 0:
+        return codec_id, b""
+    payload = recv_exactly(sock, size)
+    if payload is None:
+        raise ConnectionError("Connection closed before frame payload")
+    return codec_id, decompress_payload(payload) if compressed else payload
+
+
+register_codec(JSON_CODEC)
+if msgpack is not None:
+    register_codec(MsgpackCodec())
+
+
+def batch_to_json(messages: List[MCPMessage]) -> str:
+    # JSON-RPC batch: an array of messages sent as one frame
+    return json.dumps([m.to_dict() for m in messages], ensure_ascii=False, separators=(",", ":"))
 
 
 def validate_method(method_name: str) -> MCPMethod:
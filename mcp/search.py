@@ -0,0 +1,436 @@
+"""
+Search helpers used by the MCP server: filters, pagination, keyset cursors and the SQL search path.
+"""
+
+import base64
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, column, literal_column, select, table, tuple_
+
+from models import CAMPOS_NORMALIZADOS, Veiculos, normalizar
+from .message_type import VehicleResponse
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_OFFSET = 10_000  # deeper pages must use the cursor
+# streamed searches (`stream: true`) send results in chunks as they are read, so they may ask for more
+MAX_STREAM_SIZE = 100_000
+DEFAULT_CHUNK_SIZE = 100
+
+
+class SearchParamsError(ValueError):
+    # invalid search parameters (reported to the client as INVALID_PARAMS)
+    pass
+
+
+# text filters and how they are matched:
+#   exact    equality on the normalised column (index seek)        "toyota" == "Toyota"
+#   prefix   range on the normalised column (index seek)           "toyo" -> "Toyota"
+#   contains substring on the normalised column (reads every row)  "rolla" -> "Corolla"
+TEXT_FILTERS = ["marca", "modelo", "tp_combustivel", "tp_transmissao", "cor", "modelo_carro"]
+MATCH_MODES = ("exact", "prefix", "contains")
+DEFAULT_MATCH = "exact"
+
+
+def _match(column, value: str, mode: str):
+    value = normalizar(value)
+    if mode == "exact":
+        return column == value
+    if mode == "prefix":
+        # [value, value with its last char bumped) is the set of strings starting with value;
+        # trailing U+10FFFF cannot be bumped, so the char before it is (none left: no upper bound)
+        stem = value.rstrip(chr(sys.maxunicode))
+        if not stem:
+            return column >= value
+        upper = stem[:-1] + chr(ord(stem[-1]) + 1)
+        return and_(column >= value, column < upper)
+    return column.contains(value, autoescape=True)
+
+
+def apply_filters(query, params: Dict[str, Any]):
+    # works on a select() or an ORM Query
+    match = params.get("match", DEFAULT_MATCH)
+    if match not in MATCH_MODES:
+        raise SearchParamsError(f"'match' must be one of {', '.join(MATCH_MODES)}")
+
+    ano_min, ano_max, preco_min, preco_max, disponivel = parse_filters(params)
+
+    for campo in TEXT_FILTERS:
+        value = params.get(campo)
+        if value and normalizar(value):
+            column = getattr(Veiculos, CAMPOS_NORMALIZADOS[campo])
+            query = query.filter(_match(column, value, match))
+    if ano_min is not None:
+        query = query.filter(Veiculos.ano >= ano_min)
+    if ano_max is not None:
+        query = query.filter(Veiculos.ano <= ano_max)
+    if preco_min is not None:
+        query = query.filter(Veiculos.preco >= preco_min)
+    if preco_max is not None:
+        query = query.filter(Veiculos.preco <= preco_max)
+    if disponivel is not None:
+        query = query.filter(Veiculos.disponivel == disponivel)
+    return query
+
+
+# FREE TEXT
+# `text` ("corola", "vw golf", "camionete branca") is looked up in the carros_busca FTS5 index
+# (see models.DDL_BUSCA_TEXTO) and results come ordered by BM25 relevance instead of price.
+# Each word must appear as a substring of marca, modelo, modelo_carro, cor or motorizacao; when
+# no car has every word, words are matched by their k-letter pieces instead, so one typo still finds
+# the car ("corola" -> "coro" / "orol" -> Corolla) and the cars sharing most pieces rank first.
+TEXT_ALIASES = {
+    "vw": "volkswagen", "volks": "volkswagen", "gm": "chevrolet", "chevy": "chevrolet",
+    "camionete": "picape", "caminhonete": "picape", "pickup": "picape", "pick-up": "picape",
+    "cabrio": "conversivel", "jipe": "suv", "utilitario": "suv", "hatchback": "hatch", "seda": "sedan",
+    "branca": "branco", "preta": "preto", "prateado": "prata", "prateada": "prata", "vermelha": "vermelho",
+}
+MIN_TEXT_WORD = 3  # the trigram index cannot match anything shorter
+MAX_TEXT_WORDS = 8
+
+BUSCA = table("carros_busca", column("rowid"), column("rank"))
+_FTS_MATCH = literal_column("carros_busca").op("MATCH")
+
+
+def text_words(text: Any) -> List[str]:
+    """Normalised words of a `text` query with aliases applied; words too short to index are dropped."""
+    if not isinstance(text, str):
+        raise SearchParamsError("'text' must be a string")
+    words = []
+    for word in normalizar(text).split():
+        word = TEXT_ALIASES.get(word, word)
+        if len(word) >= MIN_TEXT_WORD and word not in words:
+            words.append(word)
+    if not words:
+        raise SearchParamsError(f"'text' needs at least one word with {MIN_TEXT_WORD} or more letters")
+    return words[:MAX_TEXT_WORDS]
+
+
+def _phrase(piece: str) -> str:
+    return '"' + piece.replace('"', '""') + '"'
+
+
+def text_query(words: List[str], fuzzy: bool = False) -> str:
+    """FTS5 MATCH expression: every word as a substring, or (fuzzy) any of its k-letter pieces."""
+    if not fuzzy:
+        return " AND ".join(_phrase(word) for word in words)
+    groups = []
+    for word in words:
+        k = 4 if len(word) >= 6 else MIN_TEXT_WORD
+        pieces = dict.fromkeys([word] + [word[i:i + k] for i in range(len(word) - k + 1)])
+        groups.append("(" + " OR ".join(_phrase(piece) for piece in pieces) + ")")
+    return " AND ".join(groups)
+
+
+def resolve_text(conn, params: Dict[str, Any]) -> Optional[str]:
+    """The MATCH expression for params["text"]: exact substrings if any car has them all, else fuzzy."""
+    text = params.get("text")
+    if text is None or text == "":
+        return None
+    words = text_words(text)
+    strict = text_query(words)
+    found = conn.execute(select(BUSCA.c.rowid).where(_FTS_MATCH(strict)).limit(1)).first()
+    return strict if found is not None else text_query(words, fuzzy=True)
+
+
+def cache_key(params: Dict[str, Any]) -> str:
+    """Canonical form of the search params: defaults applied, text normalised, keys sorted."""
+    canonical = {key: value for key, value in params.items() if value is not None and value != ""}
+    for campo in TEXT_FILTERS:
+        if campo in canonical:
+            canonical[campo] = normalizar(canonical[campo])
+    if "text" in canonical:
+        canonical["text"] = text_words(canonical["text"])
+    canonical.setdefault("match", DEFAULT_MATCH)
+    canonical["sort_by"], canonical["order"] = parse_sort(params)
+    canonical.setdefault("limit", DEFAULT_PAGE_SIZE)
+    canonical.setdefault("offset", 0)
+    return json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+# SORTING
+# `sort_by` picks the first sort key and `order` its direction (defaults in DEFAULT_ORDER); ties
+# are broken by id in the same direction. Only one page (LIMIT) is produced per request: the
+# ORDER BY walks an index where one exists (ix_carros_preco, _ano, _quilometragem and the
+# (marca, modelo, preco) ones), otherwise SQLite keeps just the top rows while it sorts.
+# "relevance" is the BM25 rank of a `text` search; cars without quilometragem are left out when
+# sorting by it.
+SORT_FIELDS = ("preco", "ano", "quilometragem", "relevance")
+SORT_ORDERS = ("asc", "desc")
+DEFAULT_ORDER = {"preco": "asc", "ano": "desc", "quilometragem": "asc", "relevance": "desc"}
+
+
+def parse_sort(params: Dict[str, Any]) -> Tuple[str, str]:
+    """(sort_by, order) with defaults: relevance for `text` searches, otherwise cheapest first."""
+    sort_by = params.get("sort_by") or ("relevance" if params.get("text") else "preco")
+    if sort_by not in SORT_FIELDS:
+        raise SearchParamsError(f"'sort_by' must be one of {', '.join(SORT_FIELDS)}")
+    if sort_by == "relevance" and not params.get("text"):
+        raise SearchParamsError("'sort_by': 'relevance' needs a 'text' search")
+    order = params.get("order") or DEFAULT_ORDER[sort_by]
+    if order not in SORT_ORDERS:
+        raise SearchParamsError(f"'order' must be one of {', '.join(SORT_ORDERS)}")
+    return sort_by, order
+
+
+# PAGINATION
+# The cursor holds the sort key and id of the last row of a page, so the next page starts with
+# an index seek instead of skipping rows with OFFSET. It also records the sort it was issued for.
+
+def encode_cursor(value: Any, vehicle_id: int, sort: Tuple[str, str] = ("preco", "asc")) -> str:
+    raw = json.dumps({"after": [value, vehicle_id], "sort": list(sort)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, sort: Tuple[str, str] = ("preco", "asc")) -> Tuple[Any, int]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        value, vehicle_id = data["after"]
+        issued_for = tuple(data.get("sort", ("preco", "asc")))
+        key = (float(value), int(vehicle_id))
+    except (ValueError, TypeError, KeyError, UnicodeError):
+        raise SearchParamsError("Invalid cursor")
+    if issued_for != tuple(sort):
+        raise SearchParamsError("Cursor belongs to a search with another sort_by / order")
+    return key
+
+
+def parse_page(params: Dict[str, Any]) -> Tuple[int, int, Optional[Tuple[Any, int]]]:
+    """Validate limit / offset / cursor and return them with defaults applied."""
+    limit = params.get("limit", DEFAULT_PAGE_SIZE)
+    offset = params.get("offset", 0)
+    cursor = params.get("cursor")
+    max_limit = MAX_STREAM_SIZE if params.get("stream") else MAX_PAGE_SIZE
+
+    if not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= max_limit:
+        raise SearchParamsError(f"'limit' must be an integer between 1 and {max_limit}")
+    if not isinstance(offset, int) or isinstance(offset, bool) or not 0 <= offset <= MAX_OFFSET:
+        raise SearchParamsError(f"'offset' must be an integer between 0 and {MAX_OFFSET}; use 'cursor' for deeper pages")
+
+    if cursor is not None and not isinstance(cursor, str):
+        raise SearchParamsError("'cursor' must be the string returned as next_cursor")
+    after = decode_cursor(cursor, parse_sort(params)) if cursor else None
+    return limit, offset, after
+
+
+RANGE_FILTERS = ("ano_min", "ano_max", "preco_min", "preco_max")
+
+
+def parse_filters(params: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Validate the range filters and `disponivel`; returns (ano_min, ano_max, preco_min, preco_max, disponivel)."""
+    values = []
+    for name in RANGE_FILTERS:
+        value = params.get(name)
+        if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool)):
+            raise SearchParamsError(f"'{name}' must be a number")
+        values.append(value)
+    disponivel = params.get("disponivel")
+    if disponivel is not None and not isinstance(disponivel, bool):
+        raise SearchParamsError("'disponivel' must be true or false")
+    return (*values, disponivel)
+
+
+def paginate(query, limit: int, offset: int, after: Optional[Tuple[Any, int]], order=None, desc: bool = False):
+    # one extra row tells whether there is a next page
+    order = order or (Veiculos.preco, Veiculos.id)
+    if after is not None:
+        key = tuple_(*order)
+        query = query.filter(key < after if desc else key > after)
+    query = query.order_by(*[column.desc() for column in order] if desc else order)
+    if offset:
+        query = query.offset(offset)
+    return query.limit(limit + 1)
+
+
+# ROWS
+# Searches select only the response columns as plain tuples (no ORM objects), and every
+# handler turns them into dicts with serialize_vehicle / serialize_vehicles.
+VEHICLE_FIELDS = [
+    "id", "marca", "modelo", "ano", "motorizacao", "tp_combustivel", "tp_transmissao",
+    "num_portas", "modelo_carro", "cor", "quilometragem", "preco", "disponivel",
+]
+# `fields` may name any VehicleResponse field that is stored in carros
+PROJECTABLE_FIELDS = [name for name in VehicleResponse.model_fields if name in VEHICLE_FIELDS]
+
+
+def parse_fields(params: Dict[str, Any]) -> List[str]:
+    """Validate the `fields` projection; all fields when it is absent."""
+    fields = params.get("fields")
+    if fields is None:
+        return VEHICLE_FIELDS
+    if not isinstance(fields, list) or not fields or not all(isinstance(name, str) for name in fields):
+        raise SearchParamsError("'fields' must be a non-empty list of field names")
+    unknown = [name for name in fields if name not in PROJECTABLE_FIELDS]
+    if unknown:
+        raise SearchParamsError(
+            f"Unknown fields: {', '.join(unknown)} (valid: {', '.join(PROJECTABLE_FIELDS)})"
+        )
+    return list(dict.fromkeys(fields))
+
+
+def vehicle_select(fields: List[str] = VEHICLE_FIELDS):
+    return select(*[getattr(Veiculos, name) for name in fields])
+
+
+def serialize_vehicle(row, fields: List[str] = VEHICLE_FIELDS) -> Dict[str, Any]:
+    # `row` is a tuple in `fields` order; extra trailing columns are left out
+    return dict(zip(fields, row))
+
+
+def serialize_vehicles(rows, fields: List[str] = VEHICLE_FIELDS) -> List[Dict[str, Any]]:
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def build_search(params: Dict[str, Any], match: Optional[str] = None):
+    """The paginated statement for `params`, the projected fields and a row -> next cursor function.
+
+    `match` is the FTS5 expression for params["text"] (see resolve_text). Rows carry the sort key
+    and id after the projected fields when they are not projected (the rank for relevance).
+    """
+    limit, offset, after = parse_page(params)
+    fields = parse_fields(params)
+    sort = sort_by, order = parse_sort(params)
+    # the cursor needs (sort key, id) even when they are not projected: select them last
+    keys = ["id"] if sort_by == "relevance" else [sort_by, "id"]
+    columns = fields + [name for name in keys if name not in fields]
+    stmt = apply_filters(vehicle_select(columns), params)
+    if match is not None:
+        stmt = stmt.join(BUSCA, BUSCA.c.rowid == Veiculos.id).where(_FTS_MATCH(match))
+    if sort_by == "relevance":
+        # rank is a BM25 score where lower is better, so "most relevant first" is ascending rank
+        stmt = stmt.add_columns(BUSCA.c.rank)
+        key_at, sort_column, desc = len(columns), BUSCA.c.rank, order == "asc"
+    else:
+        key_at, sort_column, desc = columns.index(sort_by), getattr(Veiculos, sort_by), order == "desc"
+        if sort_by == "quilometragem":
+            stmt = stmt.where(Veiculos.quilometragem.is_not(None))
+    stmt = paginate(stmt, limit, offset, after, (sort_column, Veiculos.id), desc)
+    id_at = columns.index("id")
+    return stmt, fields, lambda row: encode_cursor(row[key_at], row[id_at], sort)
+
+
+def search_sql(session, params: Dict[str, Any]) -> Dict[str, Any]:
+    """search_vehicles through SQL: one page of results plus the cursor of the next one."""
+    limit, _, _ = parse_page(params)
+    stmt, fields, cursor_of = build_search(params, resolve_text(session, params))
+    rows = session.execute(stmt).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    results = serialize_vehicles(rows, fields)
+    next_cursor = cursor_of(rows[-1]) if has_more else None
+    return {"results": results, "count": len(results), "next_cursor": next_cursor}
+
+
+# STREAMING
+# With `stream: true` the results are not returned in the response: they are passed to an
+# `emit(results)` callback in chunks of `chunk_size` while rows are still being read, and the
+# response only carries count / next_cursor.
+
+def parse_chunk_size(params: Dict[str, Any]) -> int:
+    chunk_size = params.get("chunk_size", DEFAULT_CHUNK_SIZE)
+    if not isinstance(chunk_size, int) or isinstance(chunk_size, bool) or not 1 <= chunk_size <= MAX_PAGE_SIZE:
+        raise SearchParamsError(f"'chunk_size' must be an integer between 1 and {MAX_PAGE_SIZE}")
+    return chunk_size
+
+
+def stream_chunks(rows, limit: int, chunk_size: int, emit, serialize, cursor_of) -> Dict[str, Any]:
+    """Emit `rows` (page order, at most limit + 1) in chunks; returns count and next_cursor.
+
+    `cursor_of(row)` encodes the cursor that resumes after `row`.
+    """
+    count, chunk, last, has_more = 0, [], None, False
+    for row in rows:
+        if count == limit:
+            has_more = True
+            break
+        chunk.append(row)
+        last = row
+        count += 1
+        if len(chunk) == chunk_size:
+            emit(serialize(chunk))
+            chunk = []
+    if chunk:
+        emit(serialize(chunk))
+    next_cursor = cursor_of(last) if has_more else None
+    return {"count": count, "next_cursor": next_cursor}
+
+
+def stream_sql(session, params: Dict[str, Any], emit) -> Dict[str, Any]:
+    """search_vehicles through SQL, reading `chunk_size` rows at a time from the database cursor."""
+    limit, _, _ = parse_page(params)
+    chunk_size = parse_chunk_size(params)
+    stmt, fields, cursor_of = build_search(params, resolve_text(session, params))
+
+    result = session.execute(stmt.execution_options(yield_per=chunk_size))
+    try:
+        return stream_chunks(
+            result, limit, chunk_size, emit, lambda rows: serialize_vehicles(rows, fields), cursor_of
+        )
+    finally:
+        result.close()
+
+
+# QUERY PLANS
+# Searches the agent sends most often; `python -m mcp.search` checks they are served by indexes.
+COMMON_SEARCHES = [
+    {},
+    {"marca": "Toyota", "modelo": "Corolla"},
+    {"marca": "toyo", "match": "prefix"},
+    {"modelo": "Corolla"},
+    {"ano_min": 2018, "ano_max": 2022},
+    {"preco_min": 50000, "preco_max": 90000},
+    {"tp_combustivel": "Flex", "preco_max": 80000},
+    {"tp_transmissao": "automatica", "preco_max": 80000},
+    {"disponivel": True, "preco_max": 120000},
+    {"text": "corolla"},
+    {"text": "vw golf", "preco_max": 90000},
+]
+
+
+def search_query(params: Dict[str, Any]):
+    """The paginated statement search_sql runs for `params` (exact-substring `text` match)."""
+    match = text_query(text_words(params["text"])) if params.get("text") else None
+    return build_search(params, match)[0]
+
+
+def explain_query_plan(session, stmt) -> List[str]:
+    # EXPLAIN QUERY PLAN for a select statement, one line per plan step
+    compiled = stmt.compile(dialect=session.bind.dialect)
+    args = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), args)
+    return [row[-1] for row in rows]
+
+
+def plan_access(plan: List[str]) -> str:
+    """'seek' (index range), 'ordered scan' (walks an index in ORDER BY order, stops at LIMIT) or 'full scan'."""
+    steps = [step for step in plan if "carros" in step]
+    if any(step.startswith("SCAN carros") and "INDEX" not in step for step in steps):
+        return "full scan"
+    if any(step.startswith("SEARCH carros") for step in steps):
+        return "seek"
+    return "ordered scan"
+
+
+def check_indexes(session, searches: List[Dict[str, Any]] = COMMON_SEARCHES) -> bool:
+    # True when no common search reads the whole table
+    ok = True
+    for params in searches:
+        plan = explain_query_plan(session, search_query(params))
+        access = plan_access(plan)
+        ok = ok and access != "full scan"
+        print(f"{access:<12} {json.dumps(params, ensure_ascii=False)}")
+        for step in plan:
+            print(f"             {step}")
+    return ok
+
+
+if __name__ == "__main__":
+    from sqlalchemy.orm import Session
+    from models import engine, migrar_banco
+
+    migrar_banco(engine)
+    with Session(bind=engine) as session:
+        sys.exit(0 if check_indexes(session) else 1)
@@ -1,188 +1,606 @@
 import socket
-import json
 import logging
+import threading
+from typing import Optional
+from concurrent.futures import Future, ThreadPoolExecutor
 from .protocol import (
-    MCPMessage, MCPRequest, MCPResponse, MCPMethod,
-    create_success_response, create_error_response, MCPErrorCode
+    MCPMessage, MCPMessageType, MCPMethod, create_notification,
+    create_success_response, create_error_response, MCPErrorCode, create_error_for_id,
+    recv_frame, encode_frame, CODECS, COMPRESSIONS, COMPRESS_THRESHOLD, JSON_CODEC, LAYOUTS, MAX_BATCH_SIZE,
+    codec_for_id, pack_rows
+)
+from .cache import SearchCache
+from .columnar import ColumnarInventory
+from .facets import facets_from_table, facets_sql, is_scoped
+from .similar import SimilarityIndex, parse_k
+from .search import (
+    SearchParamsError, cache_key, parse_chunk_size, parse_fields, parse_page, search_sql, serialize_vehicle,
+    stream_sql, vehicle_select
 )
 from sqlalchemy.orm import Session
-from models import Veiculos, engine
+from models import BANCO_PADRAO, Veiculos, criar_engine, ler_versao, migrar_banco
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# read-only methods: entries of a batch calling these may run concurrently
+PARALLEL_SAFE_METHODS = {
+    MCPMethod.SEARCH_VEHICLES,
+    MCPMethod.GET_VEHICLE,
+    MCPMethod.GET_VEHICLES,
+    MCPMethod.HEALTH_CHECK,
+    MCPMethod.LIST_FILTERS,
+    MCPMethod.SIMILAR_VEHICLES,
+}
+
+# methods whose vehicle lists are sent as {"fields", "rows"} on connections that negotiated layout "rows"
+ROW_LAYOUT_METHODS = {MCPMethod.SEARCH_VEHICLES, MCPMethod.GET_VEHICLES, MCPMethod.SIMILAR_VEHICLES}
+
+MAX_IDS_PER_REQUEST = 500
+
+
+def _is_vehicle_id(value) -> bool:
+    # SQLite ids are 64-bit; a bigger int would overflow when bound to the query
+    return isinstance(value, int) and not isinstance(value, bool) and -2**63 <= value < 2**63
+
+
+# "sql": SQLAlchemy queries per search; "columnar": in-memory ColumnarInventory (read-heavy traffic)
+SEARCH_ENGINES = ("sql", "columnar")
+
+class _ClientConnection:
+    """State shared by the reader thread and the workers answering one persistent connection."""
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.send_lock = threading.Lock()  # responses finish out of order, frames must not interleave
+        self._pending = 0
+        self._idle = threading.Condition()
+        # set by NEGOTIATE; how replies on this connection are encoded
+        self.codec = JSON_CODEC
+        self.layout = "objects"
+        self.compress_threshold = None  # replies at least this big are compressed
+
+    def send(self, payload: bytes, codec_id: int = 0):
+        frame = encode_frame(payload, codec_id, self.compress_threshold)  # compress outside the lock
+        with self.send_lock:
+            self.sock.sendall(frame)
+
+    def send_message(self, obj):
+        # encode a message dict (or a batch list) with the negotiated codec and send it
+        codec = self.codec
+        self.send(codec.encode(obj), codec.codec_id)
+
+    def started(self):
+        with self._idle:
+            self._pending += 1
+
+    def finished(self):
+        with self._idle:
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout=None):
+        # let in-flight requests answer before the socket is closed (client may have half-closed)
+        with self._idle:
+            self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+
 class MCPServer:
-    def __init__(self, host="127.0.0.1", port=65432):
+    def __init__(self, host="127.0.0.1", port=65432, max_workers=32, max_queue=256, idle_timeout=300,
+                 max_batch_size=MAX_BATCH_SIZE, cache_size=1024, cache_ttl=30.0, search_engine="sql",
+                 compress_threshold=COMPRESS_THRESHOLD, database=BANCO_PADRAO, pool_size=None):
         self.host = host
         self.port = port
-        logger.info(f"MCP Server ready on {host}:{port}")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.idle_timeout = idle_timeout
+        self.max_batch_size = max_batch_size
+        self.compress_threshold = compress_threshold
+        self.cache = SearchCache(cache_size, cache_ttl) if cache_size else None
+        if search_engine not in SEARCH_ENGINES:
+            raise ValueError(f"search_engine must be one of {', '.join(SEARCH_ENGINES)}")
+        self.search_engine = search_engine
+        self.columnar = None  # ColumnarInventory, loaded on start() when search_engine == "columnar"
+        self._similar = None  # SimilarityIndex, built on the first similar_vehicles (start() warms it up)
+        self._similar_lock = threading.Lock()
+
+        # handlers only read: query_only connections, one per worker (plus batch workers as overflow);
+        # the file is in WAL mode, so readers run in parallel and loads by popular_bd do not block them
+        self.database = database
+        self.pool_size = pool_size or max_workers
+        self.engine = criar_engine(database, somente_leitura=True, pool_size=self.pool_size,
+                                   max_overflow=max_workers)
+        self._write_engine = criar_engine(database, pool_size=1, max_overflow=0)  # migrations, change-log pruning
+
+        # worker pool + bounded admission: at most max_workers running and max_queue waiting
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mcp-worker")
+        self._admission = threading.BoundedSemaphore(max_workers + max_queue)
+        # batch entries fan out on their own pool so a batch never waits behind itself
+        self._batch_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mcp-batch")
+        self._stats_lock = threading.Lock()
+        self._admitted = 0
+        self._in_flight = 0
+        self._connections = 0
+        logger.info(f"MCP Server ready on {host}:{port} ({max_workers} workers, queue {max_queue})")
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests currently being processed by a worker."""
+        with self._stats_lock:
+            return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        """Number of accepted requests waiting for a free worker."""
+        with self._stats_lock:
+            return self._admitted - self._in_flight
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = {
+                "in_flight": self._in_flight,
+                "queued": self._admitted - self._in_flight,
+                "connections": self._connections,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+            }
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        if self.columnar is not None:
+            stats["columnar"] = self.columnar.stats()
+        if self._similar is not None:
+            stats["similar"] = self._similar.stats()
+        pool = self.engine.pool
+        stats["db_pool"] = {"size": pool.size(), "checked_out": pool.checkedout(), "idle": pool.checkedin()}
+        return stats
 
     def start(self):
-        """Start the TCP server and accept multiple clients."""
+        """Start the TCP server; each connection gets a reader thread, requests run on the worker pool."""
+        migrar_banco(self._write_engine)  # older inventario.db files get the search indexes
+        if self.search_engine == "columnar" and self.columnar is None:
+            self.columnar = ColumnarInventory(self.engine, write_engine=self._write_engine)
+        threading.Thread(target=self._similar_index, daemon=True, name="mcp-similar-build").start()
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             s.bind((self.host, self.port))
-            s.listen()
+            s.listen(self.max_queue)
             logger.info("Server started and waiting for connections...")
 
-            while True:
-                conn, addr = s.accept()
-                logger.info(f"Connected by {addr}")
-                # Handle each client in a separate method
-                self.handle_client(conn)
+            try:
+                while True:
+                    conn, addr = s.accept()
+                    logger.info(f"Connected by {addr}")
+                    threading.Thread(
+                        target=self.handle_client, args=(conn, addr), daemon=True,
+                        name=f"mcp-conn-{addr[1]}"
+                    ).start()
+            finally:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._batch_executor.shutdown(wait=False, cancel_futures=True)
+
+    def handle_client(self, conn, addr=None):
+        """Read pipelined requests from a persistent connection until the client closes it."""
+        client = _ClientConnection(conn, addr)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn.settimeout(self.idle_timeout)
+        with self._stats_lock:
+            self._connections += 1
 
-    def handle_client(self, conn):
-        """Handle a single client connection."""
         with conn:
             try:
-                # Reeceive all the datas from client
-                data = b""
                 while True:
-                    chunk = conn.recv(4096)
-                    if not chunk:
-                        break
-                    data += chunk
-                    if len(chunk) < 4096:
+                    # one length-prefixed frame per message
+                    frame = recv_frame(conn)
+                    if frame is None:
                         break
+                    codec_id, data = frame
+                    if data:
+                        self.submit_message(client, data, codec_id)
+            except socket.timeout:
+                logger.info(f"Closing idle connection {addr}")
+            except (ConnectionError, ValueError) as e:
+                logger.warning(f"Dropping connection {addr}: {e}")
+            finally:
+                client.wait_idle(timeout=self.idle_timeout)
+                with self._stats_lock:
+                    self._connections -= 1
+
+    def submit_message(self, client, data: bytes, codec_id: int = 0):
+        """Queue one request on the worker pool, or answer 'busy' right away when the queue is full."""
+        if not self._admission.acquire(blocking=False):
+            logger.warning("Server busy, rejecting request")
+            self._reject_busy(client, data, codec_id)
+            return
+
+        with self._stats_lock:
+            self._admitted += 1
+        client.started()
+        self._executor.submit(self._process_message, client, data, codec_id)
+
+    def _process_message(self, client, data: bytes, codec_id: int = 0):
+        with self._stats_lock:
+            self._in_flight += 1
+        try:
+            logger.info(f"Received message: {data[:100].decode('utf-8', 'replace')}...")
+
+            response = self.handle_message(data, client, codec_id)
+            if response is None:
+                return  # notification, or a batch made only of notifications: nothing to send
+
+            if isinstance(response, list):
+                message = [r.to_dict() for r in response]
+            elif hasattr(response, "to_dict"):
+                message = response.to_dict()
+            elif isinstance(response, dict):
+                message = response
+            else:
+                logger.warning(f"Unexpected response type: {type(response)}")
+                message = {"result": str(response)}
 
-                if not data:
-                    return
-                message_str = data.decode("utf-8")
-                logger.info(f"Received message: {message_str[:100]}...")
+            client.send_message(message)
+            logger.info(f"Sent response ({client.codec.name})")
 
-                response = self.handle_message(message_str)
+        except OSError as e:
+            logger.info(f"Client {client.addr} went away before the response: {e}")
+        except Exception as e:
+            logger.exception(f"Error handling client: {e}")
+            error_response = create_error_for_id(
+                _request_id_of(data, codec_id), MCPErrorCode.INTERNAL_ERROR, f"Internal server error: {e}"
+            )
+            try:
+                client.send_message(error_response.to_dict())
+            except OSError:
+                pass  #case the connection close
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+                self._admitted -= 1
+            self._admission.release()
+            client.finished()
+
+    def _reject_busy(self, client, data: bytes, codec_id: int = 0):
+        busy = create_error_for_id(
+            _request_id_of(data, codec_id), MCPErrorCode.SERVER_ERROR, "Server busy, try again later"
+        )
+        try:
+            client.send_message(busy.to_dict())
+        except OSError:
+            pass
 
+    def handle_message(self, payload, client=None, codec_id: int = 0):
+        """Process an MCP message (or a JSON-RPC batch array) and route it to the right handler."""
+        try:
+            data = codec_for_id(codec_id).decode(payload)
+        except ValueError as e:
+            return create_error_for_id(None, MCPErrorCode.PARSE_ERROR, f"Invalid message: {e}")
 
+        if isinstance(data, list):
+            return self.handle_batch(data, client)
 
-                if hasattr(response, "to_json"):
-                    response_json = response.to_json()
-                elif isinstance(response, dict):
-                    response_json = json.dumps(response)
-                else:
-                    logger.warning(f"Unexpected response type: {type(response)}")
-                    response_json = json.dumps({"result": str(response)})
-
-                # send response complete
-                conn.sendall(response_json.encode("utf-8"))
-                logger.info(f"Sent response: {len(response_json)} characters")
-
-            except Exception as e:
-                logger.exception(f"Error handling client: {e}")
-                error_response = {"error": f"Internal server error: {str(e)}"}
-                try:
-                    conn.sendall(json.dumps(error_response).encode("utf-8"))
-                except:
-                    pass  #case the connection close
-
-    def handle_message(self, message_json: str):
-        """Process MCP message and route to the right handler."""
         try:
-            message = MCPMessage.from_json(message_json)
-
-            if message.method == MCPMethod.SEARCH_VEHICLES:
-                return self._handle_search(message)
-            elif message.method == MCPMethod.GET_VEHICLE:
-                return self._handle_get_vehicle(message)
-            elif message.method == MCPMethod.HEALTH_CHECK:
-                return create_success_response(message, {"status": "ok"})
-            else:
-                return create_error_response(message, MCPErrorCode.METHOD_NOT_FOUND, "Unknown method")
+            message = MCPMessage.from_dict(data)
+            response = self.dispatch(message, client)
 
         except Exception as e:
             logger.exception("Error handling message")
+            return create_error_for_id(
+                _request_id_of(data), MCPErrorCode.INTERNAL_ERROR, f"Internal error: {e}"
+            )
+        if message.message_type == MCPMessageType.NOTIFICATION:
+            return None  # no id to answer to, same as notifications inside a batch
+        return response
+
+    def dispatch(self, message: MCPMessage, client=None):
+        """Route one parsed request to its handler; `client` is the connection it came from, if any."""
+        if message.method == MCPMethod.SEARCH_VEHICLES:
+            response = self._handle_search(message, client)
+        elif message.method == MCPMethod.GET_VEHICLE:
+            response = self._handle_get_vehicle(message)
+        elif message.method == MCPMethod.GET_VEHICLES:
+            response = self._handle_get_vehicles(message)
+        elif message.method == MCPMethod.HEALTH_CHECK:
+            response = create_success_response(message, {"status": "ok", **self.stats()})
+        elif message.method == MCPMethod.LIST_FILTERS:
+            response = self._handle_list_filters(message)
+        elif message.method == MCPMethod.SIMILAR_VEHICLES:
+            response = self._handle_similar(message)
+        elif message.method == MCPMethod.NEGOTIATE:
+            response = self._handle_negotiate(message, client)
+        else:
+            response = create_error_response(message, MCPErrorCode.METHOD_NOT_FOUND, "Unknown method")
+
+        if (client is not None and client.layout == "rows" and message.method in ROW_LAYOUT_METHODS
+                and response.result is not None):
+            response.result = pack_rows(response.result)  # new dict: cached results stay untouched
+        return response
+
+    def handle_batch(self, entries: list, client=None):
+        """Run a JSON-RPC batch; read-only sub-requests run in parallel. Returns None if nothing to answer."""
+        if not entries:
+            return create_error_for_id(None, MCPErrorCode.INVALID_REQUEST, "Empty batch")
+        if len(entries) > self.max_batch_size:
+            return create_error_for_id(
+                None, MCPErrorCode.INVALID_REQUEST,
+                f"Batch too large: {len(entries)} requests (max {self.max_batch_size})"
+            )
+
+        slots = []  # per entry: a response, a future, or None for notifications
+        for entry in entries:
+            try:
+                message = MCPMessage.from_dict(entry)
+            except ValueError as e:
+                slots.append(create_error_for_id(_request_id_of(entry), MCPErrorCode.INVALID_REQUEST, str(e)))
+                continue
+
+            notification = message.message_type == MCPMessageType.NOTIFICATION
+            if message.method in PARALLEL_SAFE_METHODS:
+                future = self._batch_executor.submit(self._dispatch_safely, message, client)
+                slots.append(None if notification else future)
+            else:
+                response = self._dispatch_safely(message, client)
+                slots.append(None if notification else response)
+
+        responses = [
+            slot.result() if isinstance(slot, Future) else slot
+            for slot in slots if slot is not None
+        ]
+        return responses or None
+
+    def _dispatch_safely(self, message: MCPMessage, client=None):
+        try:
+            return self.dispatch(message, client)
+        except Exception as e:
+            logger.exception("Error handling batch entry")
+            return create_error_response(message, MCPErrorCode.INTERNAL_ERROR, f"Internal error: {e}")
+
+    def _handle_negotiate(self, request, client):
+        """Pick the first codec the client offers that the server supports, plus the result layout."""
+        codecs = request.params.get("codecs", [JSON_CODEC.name])
+        layout = request.params.get("layout", "objects")
+        compression = request.params.get("compression")
+        if not isinstance(codecs, list) or not all(isinstance(name, str) for name in codecs):
+            return create_error_response(request, MCPErrorCode.INVALID_PARAMS, "'codecs' must be a list of names")
+        if layout not in LAYOUTS:
+            return create_error_response(
+                request, MCPErrorCode.INVALID_PARAMS, f"'layout' must be one of {', '.join(LAYOUTS)}"
+            )
+        if compression is not None and compression not in COMPRESSIONS:
+            return create_error_response(
+                request, MCPErrorCode.INVALID_PARAMS, f"'compression' must be one of {', '.join(COMPRESSIONS)}"
+            )
+        chosen = next((CODECS[name] for name in codecs if name in CODECS), None)
+        if chosen is None:
             return create_error_response(
-                MCPMessage.from_json('{"jsonrpc":"2.0","id":"error","method":"unknown"}'),
-                MCPErrorCode.INTERNAL_ERROR,
-                f"Internal error: {e}"
+                request, MCPErrorCode.INVALID_PARAMS, f"No common codec; server supports {', '.join(CODECS)}"
             )
 
-    def _handle_search(self, request):
+        if client is not None:
+            client.codec = chosen
+            client.layout = layout
+            client.compress_threshold = self.compress_threshold if compression else None
+        return create_success_response(request, {
+            "codec": chosen.name, "layout": layout, "codecs": list(CODECS),
+            "compression": compression, "compress_threshold": self.compress_threshold if compression else None,
+        })
+
+    def _handle_search(self, request, client=None):
         try:
             params = request.params or {}
-            marca = params.get("marca")
-            modelo = params.get("modelo")
-            ano_min = params.get("ano_min")
-            ano_max = params.get("ano_max")
-            tp_combustivel = params.get("tp_combustivel")
-            preco_min = params.get("preco_min")
-            preco_max = params.get("preco_max")
-
-            with Session(bind=engine) as session:
-                query = session.query(Veiculos)  # use each sessio with 'with'
-
-                if marca:
-                    query = query.filter(Veiculos.marca.ilike(f"%{marca}%"))
-                if modelo:
-                    query = query.filter(Veiculos.modelo.ilike(f"%{modelo}%"))
-                if ano_min is not None:
-                    query = query.filter(Veiculos.ano >= ano_min)
-                if ano_max is not None:
-                    query = query.filter(Veiculos.ano <= ano_max)
-                if tp_combustivel:
-                    query = query.filter(Veiculos.tp_combustivel.ilike(f"%{tp_combustivel}%"))
-                if preco_min is not None:
-                    query = query.filter(Veiculos.preco >= preco_min)
-                if preco_max is not None:
-                    query = query.filter(Veiculos.preco <= preco_max)
-
-                vehicles = query.all()
-                results = []
-
-
-
-                for vehicle in vehicles:
-                    results.append({
-                        'id': vehicle.id,
-                        'marca': vehicle.marca,
-                        'modelo': vehicle.modelo,
-                        'ano': vehicle.ano,
-                        'motorizacao': vehicle.motorizacao,
-                        'tp_combustivel': vehicle.tp_combustivel,
-                        'tp_transmissao': vehicle.tp_transmissao,
-                        'num_portas': vehicle.num_portas,
-                        'modelo_carro': vehicle.modelo_carro,
-                        'cor': vehicle.cor,
-                        'quilometragem': vehicle.quilometragem,
-                        'preco': float(vehicle.preco),
-                        'disponivel': vehicle.disponivel
-                    })
-
-
-                logger.info(f"Search returned {len(results)} vehicles")
-                return create_success_response(request, {"results": results, "count": len(results)})
+            parse_page(params)  # reject bad paging / projection params before touching the cache
+            parse_fields(params)
+            if params.get("stream"):
+                return self._stream_search(request, client)
+
+            with Session(bind=self.engine) as session:
+                if self.cache is not None:
+                    # version is read before the query, so a write during the search is never cached as fresh
+                    key = cache_key(params)
+                    version = ler_versao(session.connection())
+                    cached = self.cache.get(key, version)
+                    if cached is not None:
+                        return create_success_response(request, cached)
+
+                if self.columnar is not None and not params.get("text"):
+                    if self.cache is not None:
+                        version = self._columnar_version(version)
+                    result = self.columnar.search(params)
+                else:
+                    result = search_sql(session, params)
+
+                logger.info(f"Search returned {result['count']} vehicles")
+                if self.cache is not None and version is not None:
+                    self.cache.put(key, version, result)
+                return create_success_response(request, result)
+        except SearchParamsError as e:
+            return create_error_response(request, MCPErrorCode.INVALID_PARAMS, str(e))
+        except OSError:
+            raise  # client went away mid-stream
         except Exception as e:
             logger.exception("Erro ao processar busca de veículos")
             return create_error_response(request, MCPErrorCode.INTERNAL_ERROR, str(e))
 
+    def _columnar_version(self, version: int) -> Optional[int]:
+        # cache stamp for a columnar result: the version its rows reflect, read before the query (the
+        # rows can only move forward). While a bulk-load rebuild is pending that is older than
+        # `version`, so SearchCache.put drops the stale result; None (just rebuilt) skips the cache
+        self.columnar.refresh()
+        columnar_version = self.columnar.version
+        return None if columnar_version is None else min(version, columnar_version)
+
+    def _stream_search(self, request, client):
+        """Send the results as SEARCH_CHUNK notifications while they are read; the response closes the stream."""
+        if client is None:
+            raise SearchParamsError("'stream' needs a connection to send chunks on")
+        params = request.params
+        parse_chunk_size(params)
+        chunks = 0
+
+        def emit(results):
+            nonlocal chunks
+            chunk = {"request_id": request.message_id, "seq": chunks, "results": results}
+            if client.layout == "rows":
+                chunk = pack_rows(chunk)
+            client.send_message(create_notification(MCPMethod.SEARCH_CHUNK, chunk).to_dict())
+            chunks += 1
+
+        if self.columnar is not None and not params.get("text"):
+            summary = self.columnar.stream(params, emit)
+        else:
+            with Session(bind=self.engine) as session:
+                summary = stream_sql(session, params, emit)
+        logger.info(f"Streamed {summary['count']} vehicles in {chunks} chunks")
+        return create_success_response(request, {**summary, "chunks": chunks})
+
+    def _handle_list_filters(self, request):
+        """Facet counts (mcp/facets.py): from carros_facetas, or over the cars matching the filters in params."""
+        try:
+            params = request.params or {}
+            with Session(bind=self.engine) as session:
+                if self.cache is not None:
+                    key = "list_filters:" + cache_key(params)
+                    version = ler_versao(session.connection())
+                    cached = self.cache.get(key, version)
+                    if cached is not None:
+                        return create_success_response(request, cached)
+
+                if not is_scoped(params):
+                    result = facets_from_table(session.connection())
+                elif self.columnar is not None and not params.get("text"):
+                    if self.cache is not None:
+                        version = self._columnar_version(version)
+                    result = self.columnar.facets(params)
+                else:
+                    result = facets_sql(session, params)
+
+                if self.cache is not None and version is not None:
+                    self.cache.put(key, version, result)
+                return create_success_response(request, result)
+        except SearchParamsError as e:
+            return create_error_response(request, MCPErrorCode.INVALID_PARAMS, str(e))
+        except Exception as e:
+            logger.exception("Erro ao contar filtros")
+            return create_error_response(request, MCPErrorCode.INTERNAL_ERROR, str(e))
+
+    def _similar_index(self) -> SimilarityIndex:
+        # built once; requests arriving meanwhile wait for it instead of building their own
+        with self._similar_lock:
+            if self._similar is None:
+                self._similar = SimilarityIndex(self.engine)
+            return self._similar
+
+    def _handle_similar(self, request):
+        """The k available cars closest to vehicle `id` (mcp/similar.py), nearest first."""
+        params = request.params or {}
+        vid = params.get("id")
+        if not _is_vehicle_id(vid):
+            return create_error_response(request, MCPErrorCode.INVALID_PARAMS, "'id' must be a 64-bit integer")
+        try:
+            k = parse_k(params)
+            fields = parse_fields(params)
+        except SearchParamsError as e:
+            return create_error_response(request, MCPErrorCode.INVALID_PARAMS, str(e))
+
+        try:
+            neighbours = self._similar_index().similar(vid, k)
+            if neighbours is None:
+                return create_error_response(request, MCPErrorCode.VEHICLE_NOT_FOUND, "Vehicle not found")
+            columns = fields if "id" in fields else fields + ["id"]
+            with Session(bind=self.engine) as session:
+                found = {
+                    row.id: serialize_vehicle(row, fields)
+                    for row in session.execute(
+                        vehicle_select(columns).where(Veiculos.id.in_([nid for nid, _ in neighbours]))
+                        .where(Veiculos.disponivel.is_(True))  # sold since the index last refreshed
+                    )
+                }
+        except Exception as e:
+            logger.exception("Erro ao buscar veículos similares")
+            return create_error_response(request, MCPErrorCode.INTERNAL_ERROR, str(e))
+
+        neighbours = [(nid, distance) for nid, distance in neighbours if nid in found]
+        return create_success_response(request, {
+            "results": [found[nid] for nid, _ in neighbours],
+            "count": len(neighbours),
+            "distances": [round(distance, 4) for _, distance in neighbours],
+        })
+
     def _handle_get_vehicle(self, request):
         vid = request.params.get("id")
         if vid is None:
             return create_error_response(request, MCPErrorCode.INVALID_PARAMS, "Vehicle ID not provided")
+        if not _is_vehicle_id(vid):
+            return create_error_response(request, MCPErrorCode.INVALID_PARAMS, "'id' must be a 64-bit integer")
+        try:
+            fields = parse_fields(request.params)
+        except SearchParamsError as e:
+            return create_error_response(request, MCPErrorCode.INVALID_PARAMS, str(e))
 
-        with Session(bind=engine) as session:
-            vehicle = session.query(Veiculos).filter(Veiculos.id == vid).first()
-            if not vehicle:
+        with Session(bind=self.engine) as session:
+            row = session.execute(vehicle_select(fields).where(Veiculos.id == vid)).first()
+            if not row:
                 return create_error_response(request, MCPErrorCode.VEHICLE_NOT_FOUND, "Vehicle not found")
 
+            return create_success_response(request, {"results": serialize_vehicle(row, fields), "count": 1})
 
-
-            result = {
-                'id': vehicle.id,
-                'marca': vehicle.marca,
-                'modelo': vehicle.modelo,
-                'ano': vehicle.ano,
-                'motorizacao': vehicle.motorizacao,
-                'tp_combustivel': vehicle.tp_combustivel,
-                'tp_transmissao': vehicle.tp_transmissao,
-                'num_portas': vehicle.num_portas,
-                'modelo_carro': vehicle.modelo_carro,
-                'cor': vehicle.cor,
-                'quilometragem': vehicle.quilometragem,
-                'preco': float(vehicle.preco),
-                'disponivel': vehicle.disponivel
-                  }
-
-            return create_success_response(request, {"results": result, "count": 1})
+    def _handle_get_vehicles(self, request):
+        """Resolve a list of ids with one IN query; results keep the requested order."""
+        ids = request.params.get("ids")
+        if not isinstance(ids, list) or not ids:
+            return create_error_response(request, MCPErrorCode.INVALID_PARAMS, "'ids' must be a non-empty list")
+        if len(ids) > MAX_IDS_PER_REQUEST:
+            return create_error_response(
+                request, MCPErrorCode.INVALID_PARAMS, f"At most {MAX_IDS_PER_REQUEST} ids per request"
+            )
+        if not all(_is_vehicle_id(vid) for vid in ids):
+            return create_error_response(request, MCPErrorCode.INVALID_PARAMS, "'ids' must contain 64-bit integers")
+        try:
+            fields = parse_fields(request.params)
+        except SearchParamsError as e:
+            return create_error_response(request, MCPErrorCode.INVALID_PARAMS, str(e))
+
+        ids = list(dict.fromkeys(ids))  # drop duplicates, keep order
+        columns = fields if "id" in fields else fields + ["id"]
+        with Session(bind=self.engine) as session:
+            found = {
+                row.id: serialize_vehicle(row, fields)
+                for row in session.execute(vehicle_select(columns).where(Veiculos.id.in_(ids)))
+            }
+        results = [found[vid] for vid in ids if vid in found]
+
+        not_found = [vid for vid in ids if vid not in found]
+        return create_success_response(request, {"results": results, "count": len(results), "not_found": not_found})
+
+
+def _request_id_of(raw, codec_id: int = 0) -> Optional[str]:
+    """Best-effort id of a request that could not be handled, so the client can still match the error."""
+    try:
+        data = raw if isinstance(raw, dict) else codec_for_id(codec_id).decode(raw)
+        if isinstance(data, dict) and isinstance(data.get("id"), str):
+            return data["id"]
+    except (ValueError, TypeError):
+        pass
+    return None
 
 
 if __name__ == "__main__":
-    MCPServer().start()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MCP vehicle search server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=65432)
+    parser.add_argument("--workers", type=int, default=32, help="requests processed in parallel")
+    parser.add_argument("--queue", type=int, default=256, help="requests allowed to wait for a worker")
+    parser.add_argument("--search-engine", choices=SEARCH_ENGINES, default="sql")
+    parser.add_argument("--compress-threshold", type=int, default=COMPRESS_THRESHOLD,
+                        help="smallest reply (bytes) compressed on connections that negotiated compression")
+    parser.add_argument("--database", default=BANCO_PADRAO, help="SQLite file to serve")
+    parser.add_argument("--pool-size", type=int, default=None, help="read connections kept open (default: workers)")
+    args = parser.parse_args()
+
+    MCPServer(
+        host=args.host, port=args.port, max_workers=args.workers, max_queue=args.queue,
+        search_engine=args.search_engine, compress_threshold=args.compress_threshold,
+        database=args.database, pool_size=args.pool_size
+    ).start()
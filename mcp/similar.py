@@ -0,0 +1,312 @@
+"""
+Nearest-neighbour index for similar_vehicles: the k available cars closest to a given one.
+
+Every available car is a point in a scaled feature space:
+
+* preco, ano, quilometragem and engine size (the number in motorizacao) as z-scores over the
+  inventory (preco and quilometragem on a log scale, so R$ 10k matters more for a cheap car),
+  times FEATURE_WEIGHTS; a missing value sits at the mean;
+* modelo_carro, tp_combustivel and tp_transmissao as exact groups: a car from another group pays
+  CATEGORY_PENALTIES for each of them that differs.
+
+The distance is Euclidean over those numbers plus the penalties. Each group keeps a uniform grid
+over (preco, ano, quilometragem) with CELL_SIZE wide cells. A query visits its own cell, then
+rings of cells around it, in groups ordered by penalty, and stops as soon as no unvisited cell can
+hold a car closer than the k-th found so far. On 1M rows that is a few hundred distances, not a scan.
+
+Writes come from the carros_alteracoes log like in ColumnarInventory: a changed car leaves its cell
+and, if still available, is appended again at its new point. A bulk load ("reload everything"
+entry) or a pruned log rebuilds the index in the background.
+"""
+
+import bisect
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from array import array
+from itertools import product
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from models import Veiculos, ler_alteracoes, ler_versao, ultima_alteracao
+from .search import SearchParamsError
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_FEATURES = ("preco", "ano", "quilometragem", "motor")
+FEATURE_WEIGHTS = {"preco": 2.0, "ano": 1.0, "quilometragem": 1.0, "motor": 0.5}
+LOG_FEATURES = ("preco", "quilometragem")
+CATEGORY_FIELDS = ("modelo_carro_norm", "tp_combustivel_norm", "tp_transmissao_norm")
+CATEGORY_PENALTIES = {"modelo_carro_norm": 2.0, "tp_combustivel_norm": 0.75, "tp_transmissao_norm": 1.0}
+CELL_SIZE = 0.35  # grid cell width, in weighted standard deviations
+DEFAULT_K = 10
+MAX_K = 100
+
+FEATURE_COLUMNS = [
+    Veiculos.id, Veiculos.preco, Veiculos.ano, Veiculos.quilometragem, Veiculos.motorizacao,
+    *(getattr(Veiculos, name) for name in CATEGORY_FIELDS), Veiculos.disponivel,
+]
+
+_ENGINE_SIZE = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def engine_size(motorizacao: Any) -> Optional[float]:
+    """'1.6', '2.0 turbo', 1.6 -> litres; None when there is no number."""
+    if motorizacao is None:
+        return None
+    match = _ENGINE_SIZE.search(str(motorizacao))
+    return float(match.group().replace(",", ".")) if match else None
+
+
+def parse_k(params: Dict[str, Any]) -> int:
+    k = params.get("k", DEFAULT_K)
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_K:
+        raise SearchParamsError(f"'k' must be an integer between 1 and {MAX_K}")
+    return k
+
+
+def _raw_features(row) -> Tuple[Optional[float], ...]:
+    # (preco, ano, quilometragem, motor) of a FEATURE_COLUMNS row, logs applied
+    _, preco, ano, quilometragem, motorizacao = row[:5]
+    return (
+        math.log(preco) if preco is not None and preco > 0 else None,
+        ano,
+        math.log1p(quilometragem) if quilometragem is not None and quilometragem >= 0 else None,
+        engine_size(motorizacao),
+    )
+
+
+class _Grid:
+    """Scaled points of the available cars, bucketed by category group and grid cell."""
+
+    def __init__(self, rows, seq: int):
+        # rows: FEATURE_COLUMNS rows of available cars, ordered by id
+        self.seq = seq
+        self.ids = array("q")
+        self.coords = [array("d") for _ in NUMERIC_FEATURES]
+        self.group_of = array("H")
+        self.group_codes: Dict[Tuple, int] = {}
+        self.cells: List[Dict[Tuple[int, int, int], array]] = []  # per group: cell -> positions
+        self.extents: List[List[int]] = []  # per group: [lo, hi] cell index per grid axis
+        self.added: Dict[int, int] = {}  # id -> position, for cars appended after the build
+        self.live = 0
+
+        raw, groups = [], []
+        for row in rows:
+            self.ids.append(row[0])
+            raw.append(_raw_features(row))
+            groups.append(tuple(row[5:8]))
+
+        # z-score scale per feature: (value - mean) / std * weight
+        self.scale = []
+        for i, name in enumerate(NUMERIC_FEATURES):
+            values = [features[i] for features in raw if features[i] is not None]
+            mean = sum(values) / len(values) if values else 0.0
+            var = sum((v - mean) ** 2 for v in values) / len(values) if values else 0.0
+            self.scale.append((mean, FEATURE_WEIGHTS[name] / (math.sqrt(var) or 1.0)))
+
+        self._base = len(self.ids)  # positions below this are in id order (bisect on ids)
+        for pos, (features, group) in enumerate(zip(raw, groups)):
+            self._place(pos, self.point(features), group)
+
+    def point(self, features: Tuple[Optional[float], ...]) -> Tuple[float, ...]:
+        return tuple(
+            0.0 if value is None else (value - mean) * factor
+            for value, (mean, factor) in zip(features, self.scale)
+        )
+
+    @staticmethod
+    def cell_of(point: Tuple[float, ...]) -> Tuple[int, int, int]:
+        return (math.floor(point[0] / CELL_SIZE), math.floor(point[1] / CELL_SIZE), math.floor(point[2] / CELL_SIZE))
+
+    def _group_code(self, group: Tuple) -> int:
+        code = self.group_codes.get(group)
+        if code is None:
+            code = self.group_codes[group] = len(self.cells)
+            self.cells.append({})
+            self.extents.append(None)
+        return code
+
+    def _place(self, pos: int, point: Tuple[float, ...], group: Tuple):
+        # caller already appended ids[pos]
+        code = self._group_code(group)
+        for coord, value in zip(self.coords, point):
+            coord.append(value)
+        self.group_of.append(code)
+        cell = self.cell_of(point)
+        positions = self.cells[code].get(cell)
+        if positions is None:
+            positions = self.cells[code][cell] = array("I")
+        positions.append(pos)
+        extent = self.extents[code]
+        if extent is None:
+            self.extents[code] = [c for axis in cell for c in (axis, axis)]
+        else:
+            for axis, c in enumerate(cell):
+                extent[2 * axis] = min(extent[2 * axis], c)
+                extent[2 * axis + 1] = max(extent[2 * axis + 1], c)
+        self.live += 1
+
+    def position_of(self, vehicle_id: int) -> Optional[int]:
+        pos = self.added.get(vehicle_id)
+        if pos is not None:
+            return pos
+        i = bisect.bisect_left(self.ids, vehicle_id, 0, self._base)
+        if i < self._base and self.ids[i] == vehicle_id:
+            return i
+        return None
+
+    def remove(self, vehicle_id: int):
+        pos = self.position_of(vehicle_id)
+        if pos is None:
+            return
+        point = tuple(coord[pos] for coord in self.coords)
+        positions = self.cells[self.group_of[pos]].get(self.cell_of(point))
+        if positions is not None and pos in positions:
+            positions.remove(pos)
+            self.live -= 1
+        self.added.pop(vehicle_id, None)
+
+    def add(self, row):
+        # a FEATURE_COLUMNS row of an available car, not in the grid
+        pos = len(self.ids)
+        self.ids.append(row[0])
+        self.added[row[0]] = pos
+        self._place(pos, self.point(_raw_features(row)), tuple(row[5:8]))
+
+    def nearest(self, point: Tuple[float, ...], group: Tuple, k: int, exclude: int) -> List[Tuple[int, float]]:
+        """(id, distance) of the k cars closest to `point`, nearest first; `exclude` is left out."""
+        best: List[Tuple[float, int]] = []  # max-heap of (-distance², -id)
+        ids, (xs, ys, zs, ms) = self.ids, self.coords
+        px, py, pz, pm = point
+        center = self.cell_of(point)
+
+        def worst() -> float:
+            return -best[0][0] if len(best) == k else math.inf
+
+        def visit(positions, penalty):
+            for pos in positions:
+                vehicle_id = ids[pos]
+                if vehicle_id == exclude:
+                    continue
+                d2 = penalty + (xs[pos] - px) ** 2 + (ys[pos] - py) ** 2 + (zs[pos] - pz) ** 2 + (ms[pos] - pm) ** 2
+                if len(best) < k:
+                    heapq.heappush(best, (-d2, -vehicle_id))
+                elif (d2, vehicle_id) < (-best[0][0], -best[0][1]):
+                    heapq.heapreplace(best, (-d2, -vehicle_id))
+
+        # groups with fewer differing categories first
+        penalties = sorted(
+            (sum(CATEGORY_PENALTIES[name] ** 2 for name, a, b in zip(CATEGORY_FIELDS, other, group) if a != b), code)
+            for other, code in self.group_codes.items()
+        )
+        for penalty, code in penalties:
+            if penalty > worst():
+                break
+            cells, extent = self.cells[code], self.extents[code]
+            if extent is None:
+                continue
+            max_ring = max(max(abs(c - extent[2 * axis]), abs(c - extent[2 * axis + 1])) for axis, c in enumerate(center))
+            for ring in range(max_ring + 1):
+                # every cell of this ring is at least (ring - 1) cells away from the point on some axis
+                if ring and penalty + ((ring - 1) * CELL_SIZE) ** 2 > worst():
+                    break
+                if (2 * ring + 1) ** 3 - (2 * ring - 1) ** 3 > len(cells):
+                    # fewer occupied cells left than cells in the ring: visit the rest directly
+                    for cell, positions in cells.items():
+                        if max(abs(a - b) for a, b in zip(cell, center)) >= ring:
+                            visit(positions, penalty)
+                    break
+                for offset in product(range(-ring, ring + 1), repeat=3):
+                    if max(abs(o) for o in offset) == ring:
+                        positions = cells.get((center[0] + offset[0], center[1] + offset[1], center[2] + offset[2]))
+                        if positions:
+                            visit(positions, penalty)
+
+        return [(-neg_id, math.sqrt(-neg_d2)) for neg_d2, neg_id in sorted(best, reverse=True)]
+
+
+class SimilarityIndex:
+    """similar_vehicles over a _Grid of the available cars, kept current from the change log."""
+
+    def __init__(self, engine, background_rebuild: bool = True):
+        self.engine = engine
+        self.background_rebuild = background_rebuild
+        self._lock = threading.RLock()
+        self._seq = 0
+        self._version: Optional[int] = None
+        self._rebuilding = False
+        self._grid = self._build_grid()
+        self._seq = self._grid.seq
+
+    def _build_grid(self) -> _Grid:
+        started = time.perf_counter()
+        with self.engine.connect() as conn:
+            seq = ultima_alteracao(conn)
+            stmt = select(*FEATURE_COLUMNS).where(Veiculos.disponivel.is_(True)).order_by(Veiculos.id)
+            grid = _Grid(conn.execute(stmt.execution_options(yield_per=10_000)), seq)
+        logger.info(f"Similarity index: {grid.live} cars in {time.perf_counter() - started:.2f}s")
+        return grid
+
+    def _rebuild(self):
+        try:
+            grid = self._build_grid()
+            with self._lock:
+                # changes after `seq` are replayed on the new grid; replay is idempotent
+                self._grid = grid
+                self._seq = grid.seq
+                self._version = None
+        except Exception:
+            logger.exception("Similarity index rebuild failed")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def refresh(self):
+        """Apply the writes logged since the last refresh (cheap when nothing changed)."""
+        with self._lock, self.engine.connect() as conn:
+            version = ler_versao(conn)
+            if version == self._version:
+                return
+            changes = ler_alteracoes(conn, self._seq)
+            pruned = bool(changes) and changes[0][0] > self._seq + 1  # see ColumnarInventory.refresh
+            if pruned or any(carro_id is None for _, carro_id in changes):
+                if not self._rebuilding:
+                    self._rebuilding = True
+                    if self.background_rebuild:
+                        threading.Thread(target=self._rebuild, daemon=True, name="mcp-similar-rebuild").start()
+                    else:
+                        self._rebuild()
+                return
+
+            changed = list({carro_id for _, carro_id in changes if carro_id is not None})
+            for start in range(0, len(changed), 500):
+                chunk = changed[start:start + 500]
+                found = {row[0]: row for row in conn.execute(select(*FEATURE_COLUMNS).where(Veiculos.id.in_(chunk)))}
+                for vehicle_id in chunk:
+                    self._grid.remove(vehicle_id)
+                    row = found.get(vehicle_id)
+                    if row is not None and row.disponivel:
+                        self._grid.add(row)
+            if changes:
+                self._seq = changes[-1][0]
+            self._version = version
+
+    def similar(self, vehicle_id: int, k: int = DEFAULT_K) -> Optional[List[Tuple[int, float]]]:
+        """(id, distance) of the k available cars most like `vehicle_id` (sold or not); None if it does not exist."""
+        self.refresh()
+        with self.engine.connect() as conn:
+            row = conn.execute(select(*FEATURE_COLUMNS).where(Veiculos.id == vehicle_id)).first()
+        if row is None:
+            return None
+        with self._lock:
+            grid = self._grid
+            return grid.nearest(grid.point(_raw_features(row)), tuple(row[5:8]), k, vehicle_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"cars": self._grid.live, "seq": self._seq, "rebuilding": self._rebuilding}
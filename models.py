@@ -1,15 +1,45 @@
 #define a tabela de veículos e helpers
 import logging
+import unicodedata
+from bisect import bisect_right
 from datetime import datetime
 from typing import Optional
 from sqlalchemy import (
-    Column, Integer, String, Float, DateTime, Text, Boolean, Index, create_engine
+    Column, Integer, String, Float, DateTime, Text, Boolean, Index, create_engine, event, inspect
 )
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 
 
 Base = declarative_base()
 
+
+def normalizar(texto: Optional[str]) -> Optional[str]:
+    """Minusculas, sem acento e sem espaco sobrando: 'Automática ' -> 'automatica'."""
+    if texto is None:
+        return None
+    sem_acento = unicodedata.normalize("NFKD", str(texto))
+    sem_acento = "".join(c for c in sem_acento if not unicodedata.combining(c))
+    return " ".join(sem_acento.casefold().split())
+
+
+# coluna original -> copia normalizada usada nos filtros (igualdade e prefixo usam indice)
+CAMPOS_NORMALIZADOS = {
+    "marca": "marca_norm",
+    "modelo": "modelo_norm",
+    "tp_combustivel": "tp_combustivel_norm",
+    "tp_transmissao": "tp_transmissao_norm",
+    "cor": "cor_norm",
+    "modelo_carro": "modelo_carro_norm",
+}
+
+
+def normalizar_linha(dados: dict) -> dict:
+    """Preenche as colunas *_norm de um dict de carro (para inserts via Core, que nao passam pelo ORM)."""
+    for campo, campo_norm in CAMPOS_NORMALIZADOS.items():
+        if campo in dados:
+            dados[campo_norm] = normalizar(dados[campo])
+    return dados
+
 class Veiculos(Base):
     __tablename__ = "carros"
 
@@ -32,15 +62,346 @@ class Veiculos(Base):
     preco = Column(Float, nullable=False)
     disponivel = Column(Boolean, default=True) # Disponível para venda
 
+    # copias normalizadas (ver normalizar); preenchidas automaticamente no insert/update
+    marca_norm = Column(String(50))
+    modelo_norm = Column(String(100))
+    tp_combustivel_norm = Column(String(20))
+    tp_transmissao_norm = Column(String(20))
+    cor_norm = Column(String(30))
+    modelo_carro_norm = Column(String(30))
+
+    # indices escolhidos a partir dos filtros e ordenacoes de search_vehicles; como id é o rowid,
+    # cada indice ja vem ordenado por (colunas, id), o que serve a paginacao por (chave, id):
+    # "os 10 Corolla mais baratos" le so 10 entradas de ix_carros_modelo_norm_preco
+    __table_args__ = (
+        Index("ix_carros_marca_modelo_norm_preco", "marca_norm", "modelo_norm", "preco"),
+        Index("ix_carros_modelo_norm_preco", "modelo_norm", "preco"),
+        Index("ix_carros_ano", "ano"),
+        Index("ix_carros_quilometragem", "quilometragem"),
+        Index("ix_carros_preco", "preco"),
+        Index("ix_carros_combustivel_norm_preco", "tp_combustivel_norm", "preco"),
+        Index("ix_carros_disponivel_preco", "disponivel", "preco"),
+    )
 
       
     def __repr__(self):
         return f"<Carro - marca='{self.marca}' -  modelo='{self.modelo}' - ano={self.ano} -  preco={self.preco})>"
     
 
+@event.listens_for(Veiculos, "before_insert")
+@event.listens_for(Veiculos, "before_update")
+def _preencher_normalizados(mapper, connection, veiculo):
+    for campo, campo_norm in CAMPOS_NORMALIZADOS.items():
+        setattr(veiculo, campo_norm, normalizar(getattr(veiculo, campo)))
+
+
+class VersaoInventario(Base):
+    # contador unico incrementado por gatilho a cada escrita em carros (invalida caches de busca)
+    __tablename__ = "carros_versao"
+
+    id = Column(Integer, primary_key=True)
+    versao = Column(Integer, nullable=False, default=0)
+
+
+class AlteracaoCarro(Base):
+    # log de ids alterados em carros, preenchido por gatilho; permite atualizar indices em memoria
+    # de forma incremental. carro_id NULL significa "tudo mudou" (ex.: carga em massa)
+    __tablename__ = "carros_alteracoes"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    carro_id = Column(Integer)
+
+
+# gatilhos mantidos por migrar_banco; SQLite so tem gatilhos por linha
+GATILHOS = {
+    f"trg_carros_versao_{operacao.lower()}": (
+        f"CREATE TRIGGER IF NOT EXISTS trg_carros_versao_{operacao.lower()} AFTER {operacao} ON carros "
+        "BEGIN UPDATE carros_versao SET versao = versao + 1 WHERE id = 1; END"
+    )
+    for operacao in ("INSERT", "UPDATE", "DELETE")
+}
+GATILHOS.update({
+    "trg_carros_alteracoes_insert": (
+        "CREATE TRIGGER IF NOT EXISTS trg_carros_alteracoes_insert AFTER INSERT ON carros "
+        "BEGIN INSERT INTO carros_alteracoes (carro_id) VALUES (new.id); END"
+    ),
+    "trg_carros_alteracoes_update": (
+        "CREATE TRIGGER IF NOT EXISTS trg_carros_alteracoes_update AFTER UPDATE ON carros "
+        "BEGIN INSERT INTO carros_alteracoes (carro_id) VALUES (old.id); "
+        "INSERT INTO carros_alteracoes (carro_id) SELECT new.id WHERE new.id != old.id; END"
+    ),
+    "trg_carros_alteracoes_delete": (
+        "CREATE TRIGGER IF NOT EXISTS trg_carros_alteracoes_delete AFTER DELETE ON carros "
+        "BEGIN INSERT INTO carros_alteracoes (carro_id) VALUES (old.id); END"
+    ),
+})
+
+
+# busca por texto livre (parametro `text` de search_vehicles): indice FTS5 de conteudo externo
+# sobre as colunas normalizadas de carros. O tokenizador trigram indexa cada trecho de 3 letras,
+# entao qualquer substring (e, na busca, palavras com erro de digitacao) vira uma consulta ao indice
+CAMPOS_BUSCA_TEXTO = ["marca_norm", "modelo_norm", "modelo_carro_norm", "cor_norm", "motorizacao"]
+# pesos do bm25 por coluna, na ordem de CAMPOS_BUSCA_TEXTO: acertar o modelo vale mais que a cor
+PESOS_BUSCA_TEXTO = [2.0, 3.0, 1.5, 1.0, 1.0]
+
+DDL_BUSCA_TEXTO = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS carros_busca USING fts5({', '.join(CAMPOS_BUSCA_TEXTO)}, "
+    "content='carros', content_rowid='id', tokenize='trigram')"
+)
+
+_novos = ", ".join(f"new.{campo}" for campo in CAMPOS_BUSCA_TEXTO)
+_antigos = ", ".join(f"old.{campo}" for campo in CAMPOS_BUSCA_TEXTO)
+_apagar = (
+    f"INSERT INTO carros_busca (carros_busca, rowid, {', '.join(CAMPOS_BUSCA_TEXTO)}) "
+    f"VALUES ('delete', old.id, {_antigos});"
+)
+_inserir = f"INSERT INTO carros_busca (rowid, {', '.join(CAMPOS_BUSCA_TEXTO)}) VALUES (new.id, {_novos});"
+
+# mantem carros_busca igual a carros; separados de GATILHOS porque a carga em massa so tira estes
+# quando vai reconstruir os indices (ver reconstruir_busca_texto)
+GATILHOS_BUSCA = {
+    "trg_carros_busca_insert": f"CREATE TRIGGER IF NOT EXISTS trg_carros_busca_insert AFTER INSERT ON carros "
+                               f"BEGIN {_inserir} END",
+    "trg_carros_busca_update": f"CREATE TRIGGER IF NOT EXISTS trg_carros_busca_update AFTER UPDATE ON carros "
+                               f"BEGIN {_apagar} {_inserir} END",
+    "trg_carros_busca_delete": f"CREATE TRIGGER IF NOT EXISTS trg_carros_busca_delete AFTER DELETE ON carros "
+                               f"BEGIN {_apagar} END",
+}
+
+
+def reconstruir_busca_texto(conn):
+    """Reindexa carros_busca a partir de carros (depois de escrever em carros sem GATILHOS_BUSCA)."""
+    conn.exec_driver_sql("INSERT INTO carros_busca (carros_busca) VALUES ('rebuild')")
+
+
+# contagens por valor de filtro (metodo list_filters): carros_facetas guarda quantos carros tem cada
+# marca, modelo, cor, ano, faixa de preco... e os gatilhos abaixo somam e subtraem a cada escrita.
+# "Toyota (1.204)" vira a leitura de umas 100 linhas, em vez de um GROUP BY sobre carros
+# limite inferior de cada faixa de preco (a ultima nao tem teto)
+FAIXAS_PRECO = [0, 20_000, 40_000, 60_000, 80_000, 100_000, 150_000, 200_000, 300_000, 500_000]
+
+
+def faixa_preco(preco: float) -> int:
+    """Limite inferior da faixa de FAIXAS_PRECO em que `preco` cai."""
+    return FAIXAS_PRECO[max(bisect_right(FAIXAS_PRECO, preco) - 1, 0)]
+
+
+def faixa_preco_sql(preco: str) -> str:
+    """faixa_preco como expressao SQL sobre a coluna `preco`."""
+    casos = " ".join(f"WHEN {preco} >= {limite} THEN {limite}" for limite in reversed(FAIXAS_PRECO[1:]))
+    return f"CASE {casos} ELSE {FAIXAS_PRECO[0]} END"
+
+
+class ContagemFaceta(Base):
+    # quantos carros tem `valor` em `campo` (valor normalizado; rotulo e como ele aparece em carros,
+    # o menor quando ha grafias diferentes). Linhas com total 0 ficam ate a proxima reconstrucao
+    __tablename__ = "carros_facetas"
+
+    campo = Column(String(20), primary_key=True)
+    valor = Column(String(100), primary_key=True)
+    rotulo = Column(String(100))
+    total = Column(Integer, nullable=False, default=0)
+
+
+# campo de carros_facetas -> (valor, rotulo) como expressoes SQL sobre uma linha de carros
+CAMPOS_FACETAS = {
+    **{campo: (f"{{linha}}.{campo_norm}", f"{{linha}}.{campo}") for campo, campo_norm in CAMPOS_NORMALIZADOS.items()},
+    "ano": ("{linha}.ano", "{linha}.ano"),
+    "preco": (faixa_preco_sql("{linha}.preco"), faixa_preco_sql("{linha}.preco")),
+    "disponivel": ("{linha}.disponivel", "{linha}.disponivel"),
+}
+
+
+def _somar_faceta(campo, linha, condicao=""):
+    valor, rotulo = (expr.format(linha=linha) for expr in CAMPOS_FACETAS[campo])
+    return (
+        f"INSERT INTO carros_facetas (campo, valor, rotulo, total) SELECT '{campo}', {valor}, {rotulo}, 1 "
+        f"WHERE {valor} IS NOT NULL{condicao} ON CONFLICT (campo, valor) "
+        "DO UPDATE SET total = total + 1, rotulo = MIN(rotulo, excluded.rotulo);"
+    )
+
+
+def _subtrair_faceta(campo, linha, condicao=""):
+    valor = CAMPOS_FACETAS[campo][0].format(linha=linha)
+    return f"UPDATE carros_facetas SET total = total - 1 WHERE campo = '{campo}' AND valor = {valor}{condicao};"
+
+
+def _mudou(campo):
+    # no update so mexe nos campos cujo valor mudou (trocar o preco dentro da faixa nao conta)
+    return " AND {0} IS NOT {1}".format(*(CAMPOS_FACETAS[campo][0].format(linha=linha) for linha in ("old", "new")))
+
+
+_somar = " ".join(_somar_faceta(campo, "new") for campo in CAMPOS_FACETAS)
+_subtrair = " ".join(_subtrair_faceta(campo, "old") for campo in CAMPOS_FACETAS)
+_trocar = " ".join(
+    f"{_subtrair_faceta(campo, 'old', _mudou(campo))} {_somar_faceta(campo, 'new', _mudou(campo))}"
+    for campo in CAMPOS_FACETAS
+)
+
+# separados de GATILHOS pelo mesmo motivo de GATILHOS_BUSCA (ver reconstruir_facetas)
+GATILHOS_FACETAS = {
+    "trg_carros_facetas_insert": f"CREATE TRIGGER IF NOT EXISTS trg_carros_facetas_insert AFTER INSERT ON carros "
+                                 f"BEGIN {_somar} END",
+    "trg_carros_facetas_update": f"CREATE TRIGGER IF NOT EXISTS trg_carros_facetas_update AFTER UPDATE ON carros "
+                                 f"BEGIN {_trocar} END",
+    "trg_carros_facetas_delete": f"CREATE TRIGGER IF NOT EXISTS trg_carros_facetas_delete AFTER DELETE ON carros "
+                                 f"BEGIN {_subtrair} END",
+}
+
+
+def reconstruir_facetas(conn):
+    """Recalcula carros_facetas a partir de carros (depois de escrever em carros sem GATILHOS_FACETAS)."""
+    conn.exec_driver_sql("DELETE FROM carros_facetas")
+    for campo, expressoes in CAMPOS_FACETAS.items():
+        valor, rotulo = (expr.format(linha="carros") for expr in expressoes)
+        conn.exec_driver_sql(
+            f"INSERT INTO carros_facetas (campo, valor, rotulo, total) "
+            f"SELECT '{campo}', {valor}, MIN({rotulo}), COUNT(*) FROM carros WHERE {valor} IS NOT NULL GROUP BY {valor}"
+        )
+
+
+def ler_facetas(conn):
+    """(campo, valor, rotulo, total) de carros_facetas, sem os valores que nenhum carro tem mais."""
+    return conn.exec_driver_sql("SELECT campo, valor, rotulo, total FROM carros_facetas WHERE total > 0").fetchall()
+
+
+def ler_versao(conn) -> int:
+    """Versao atual do inventario; muda sempre que alguma linha de carros e escrita (em qualquer processo)."""
+    return conn.exec_driver_sql("SELECT versao FROM carros_versao WHERE id = 1").scalar() or 0
+
+
+def ler_alteracoes(conn, desde: int):
+    """(seq, carro_id) registrados depois de `desde`, em ordem."""
+    return conn.exec_driver_sql(
+        "SELECT seq, carro_id FROM carros_alteracoes WHERE seq > ? ORDER BY seq", (desde,)
+    ).fetchall()
+
+
+def ultima_alteracao(conn) -> int:
+    """Ultimo seq ja usado no log, mesmo que a linha tenha sido podada (AUTOINCREMENT nao reusa seq)."""
+    return conn.exec_driver_sql(
+        "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'carros_alteracoes'), 0), "
+        "COALESCE((SELECT MAX(seq) FROM carros_alteracoes), 0))"
+    ).scalar()
+
+
+def podar_alteracoes(conn, manter: int = 100_000):
+    # o log cresce a cada escrita; consumidores que ficarem para tras recarregam tudo
+    conn.exec_driver_sql(
+        "DELETE FROM carros_alteracoes WHERE seq <= (SELECT MAX(seq) FROM carros_alteracoes) - ?", (manter,)
+    )
+
+
+# indices de versoes anteriores, substituidos pelos das colunas normalizadas (e depois pelos com preco)
+INDICES_OBSOLETOS = [
+    "ix_carros_marca_modelo", "ix_carros_combustivel_preco", "ix_carros_marca_modelo_norm", "ix_carros_modelo_norm",
+]
+
+
+def _adicionar_colunas_normalizadas(conn, lote=10_000):
+    # inventario.db antigos: cria as colunas *_norm e preenche as linhas existentes
+    existentes = {col["name"] for col in inspect(conn).get_columns("carros")}
+    for campo_norm in CAMPOS_NORMALIZADOS.values():
+        if campo_norm not in existentes:
+            tipo = Veiculos.__table__.c[campo_norm].type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE carros ADD COLUMN {campo_norm} {tipo}")
+
+    campos = list(CAMPOS_NORMALIZADOS)
+    sets = ", ".join(f"{CAMPOS_NORMALIZADOS[c]} = ?" for c in campos)
+    ultimo_id = 0
+    while True:
+        linhas = conn.exec_driver_sql(
+            f"SELECT id, {', '.join(campos)} FROM carros "
+            f"WHERE id > ? AND marca_norm IS NULL ORDER BY id LIMIT {lote}",
+            (ultimo_id,),
+        ).fetchall()
+        if not linhas:
+            break
+        conn.exec_driver_sql(
+            f"UPDATE carros SET {sets} WHERE id = ?",
+            [tuple(normalizar(v) for v in linha[1:]) + (linha[0],) for linha in linhas],
+        )
+        ultimo_id = linhas[-1][0]
+
+
+def migrar_banco(engine):
+    """Cria tabelas e indices que faltam (inclusive em inventario.db antigos) e atualiza as estatisticas."""
+    tinha_facetas = inspect(engine).has_table("carros_facetas")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        _adicionar_colunas_normalizadas(conn)
+        for nome in INDICES_OBSOLETOS:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {nome}")
+
+        existentes = {index["name"] for index in inspect(conn).get_indexes("carros")}
+        novos = [index for index in Veiculos.__table__.indexes if index.name not in existentes]
+        for index in novos:
+            index.create(bind=conn)
+        if novos:
+            conn.exec_driver_sql("ANALYZE carros")
+
+        conn.exec_driver_sql("INSERT OR IGNORE INTO carros_versao (id, versao) VALUES (1, 0)")
+        for ddl in GATILHOS.values():
+            conn.exec_driver_sql(ddl)
+
+        if not inspect(conn).has_table("carros_busca"):
+            conn.exec_driver_sql(DDL_BUSCA_TEXTO)
+            reconstruir_busca_texto(conn)  # indexa as linhas que ja existem
+            # `rank` (usado no ORDER BY) passa a ser o bm25 com os pesos por coluna
+            conn.exec_driver_sql(
+                "INSERT INTO carros_busca (carros_busca, rank) VALUES ('rank', ?)",
+                (f"bm25({', '.join(str(peso) for peso in PESOS_BUSCA_TEXTO)})",),
+            )
+        for ddl in GATILHOS_BUSCA.values():
+            conn.exec_driver_sql(ddl)
+
+        if not tinha_facetas:
+            reconstruir_facetas(conn)  # conta as linhas que ja existem
+        for ddl in GATILHOS_FACETAS.values():
+            conn.exec_driver_sql(ddl)
+
+
+BANCO_PADRAO = "inventario.db"
+
+# pragmas aplicados a cada conexao nova (ver criar_engine). Com WAL leitores nao esperam o
+# escritor: uma carga do popular_bd nao trava as buscas do servidor. mmap_size le as paginas
+# direto do cache do SO em vez de copiar para o cache de cada conexao
+PRAGMAS_CONEXAO = {
+    "busy_timeout": 5000,  # ms esperando um lock antes de "database is locked"
+    "journal_mode": "WAL",  # fica gravado no arquivo
+    "synchronous": "NORMAL",  # seguro com WAL; um crash da maquina perde no maximo a ultima transacao
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -16384,  # 16 MB por conexao
+    "temp_store": "MEMORY",
+}
+
+
+def criar_engine(caminho: str = BANCO_PADRAO, pragmas: Optional[dict] = None, somente_leitura: bool = False,
+                 **opcoes):
+    """Engine SQLite que aplica PRAGMAS_CONEXAO (ou `pragmas`) em cada conexao do pool.
+
+    somente_leitura=True liga query_only (pool de leitura dos workers do servidor).
+    `opcoes` vao para create_engine, ex.: pool_size e max_overflow.
+    """
+    engine = create_engine(f"sqlite:///{caminho}", **opcoes)
+    pragmas = dict(PRAGMAS_CONEXAO if pragmas is None else pragmas)
+    if somente_leitura:
+        pragmas["query_only"] = "ON"
+
+    @event.listens_for(engine, "connect")
+    def _aplicar_pragmas(conexao, _registro):
+        cursor = conexao.cursor()
+        for nome, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {nome} = {valor}")
+        cursor.close()
+
+    return engine
+
+
 #criar BD
-engine = create_engine('sqlite:///inventario.db') 
+engine = criar_engine()
 if __name__ == "__main__":
-    Base.metadata.create_all(engine)
+    migrar_banco(engine)
 
 logging.info("BD criado!")
\ No newline at end of file
@@ -1,18 +1,17 @@
-from models import Base, Veiculos, engine
+from models import (
+    GATILHOS, GATILHOS_BUSCA, GATILHOS_FACETAS, Veiculos, criar_engine, engine as engine_padrao, migrar_banco,
+    normalizar, reconstruir_busca_texto, reconstruir_facetas
+)
 
+import argparse
 import logging  #debugger
 import random
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
 from faker import Faker
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session  #criar sessão
-
-# --- Conectar ao banco DB existente 
-engine = create_engine("sqlite:///inventario.db")
-Base.metadata.create_all(engine)
-
-# --- Sessão ---
-session = Session(engine)
+from sqlalchemy import insert
 
 
 faker = Faker("pt_BR")
@@ -68,52 +67,170 @@ categoria_por_modelo = {
 }
 
 
-def alimentar_banco(quantidade=100):
-    logging.info(f"Inicicando alimentação do BD, com {quantidade}de veículos fictícicos")
-    
-    veiculos = []
+# normalizar so ve o vocabulario acima, entao cada valor e normalizado uma vez
+_normalizar = lru_cache(maxsize=None)(normalizar)
+
+# pragmas da carga em massa: sem fsync (um crash no meio exige recarregar). O journal continua
+# WAL (criar_engine): trocar o modo exige ser a unica conexao aberta no arquivo
+PRAGMAS_CARGA = {
+    "synchronous": "OFF",
+    "cache_size": "-65536",  # 64 MB
+    "temp_store": "MEMORY",
+}
+
 
+def gerar_veiculos(quantidade):
+    """Gera `quantidade` carros ficticios, um dict por vez (ja com as colunas *_norm)."""
+    marcas = list(modelos_por_marca.keys())
     for _ in range(quantidade):
-        marca = random.choice(list(modelos_por_marca.keys()))
-        modelo = random.choice(modelos_por_marca[marca])  
+        marca = random.choice(marcas)
+        modelo = random.choice(modelos_por_marca[marca])
         modelo_carro = categoria_por_modelo[modelo]
-
-        ano = random.randint(2005, 2025)
-        motorizacao = f"{random.randint(1, 3)}.{random.choice(['0', '6', '8'])}" #ira criar valores padrões de motor como 1.0, 1.6, 2.0 e etc...
         tp_combustivel = random.choice(combustiveis)
         tp_transmissao = random.choice(transmissoes)
-        num_portas = random.choice([2, 4])
         cor = random.choice(cores)
-        quilometragem = random.randint(1000, 500_000) #carros de 1000km até meio milhao 
-        preco = round(random.uniform(30000, 250000), 2)
-        disponivel = random.choice([True, True, True, False])  # 75% chance de disponível
-
-        veiculo = Veiculos(
-            marca=marca,
-            modelo=modelo,
-            ano=ano,
-            motorizacao=motorizacao,
-            tp_combustivel=tp_combustivel,
-            tp_transmissao=tp_transmissao,
-            num_portas=num_portas,
-            modelo_carro=modelo_carro,
-            cor=cor,
-            quilometragem=quilometragem,
-            preco=preco,
-            disponivel=disponivel,
-            )
-
-        veiculos.append(veiculo)
-    
-    #adicionar novos values ao BD
-    session.add_all(veiculos)
-    session.commit()
-    session.close()
-
-    logging.info(f"Inseridos {len(veiculos)} ao BD")
 
+        yield {
+            "marca": marca,
+            "modelo": modelo,
+            "ano": random.randint(2005, 2025),
+            "motorizacao": f"{random.randint(1, 3)}.{random.choice(['0', '6', '8'])}", #ira criar valores padrões de motor como 1.0, 1.6, 2.0 e etc...
+            "tp_combustivel": tp_combustivel,
+            "tp_transmissao": tp_transmissao,
+            "num_portas": random.choice([2, 4]),
+            "modelo_carro": modelo_carro,
+            "cor": cor,
+            "quilometragem": random.randint(1000, 500_000), #carros de 1000km até meio milhao
+            "preco": round(random.uniform(30000, 250000), 2),
+            "disponivel": random.choice([True, True, True, False]),  # 75% chance de disponível
+            "marca_norm": _normalizar(marca),
+            "modelo_norm": _normalizar(modelo),
+            "tp_combustivel_norm": _normalizar(tp_combustivel),
+            "tp_transmissao_norm": _normalizar(tp_transmissao),
+            "cor_norm": _normalizar(cor),
+            "modelo_carro_norm": _normalizar(modelo_carro),
+        }
+
+
+def _aplicar_pragmas(conn, pragmas):
+    # devolve os valores anteriores, para restaurar depois da carga
+    anteriores = {}
+    for nome, valor in pragmas.items():
+        anteriores[nome] = conn.exec_driver_sql(f"PRAGMA {nome}").scalar()
+        conn.exec_driver_sql(f"PRAGMA {nome} = {valor}")
+    return anteriores
+
+
+def em_lotes(linhas, tamanho):
+    """Agrupa um iteravel em listas de ate `tamanho` itens, sem ler tudo para a memoria."""
+    linhas = iter(linhas)
+    while True:
+        lote = list(islice(linhas, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+@contextmanager
+def conexao_de_carga(engine=None, massa=False, reconstruir_indices=False):
+    """Conexao para escrever muitas linhas em carros; faz commit no fim (ou rollback se der erro).
+
+    massa=True aplica PRAGMAS_CARGA e tira os gatilhos de carros durante a carga. No fim grava
+    uma unica alteracao com carro_id NULL e sobe a versao, o que faz o cache e o motor colunar
+    recarregarem tudo de uma vez, e reconstroi o indice de texto livre (carros_busca) e as
+    contagens do list_filters (carros_facetas).
+    Exige acesso exclusivo de escrita: o DROP TRIGGER vale para todas as conexoes, entao o que
+    outro processo gravar durante a carga nao passa por carros_versao nem carros_alteracoes e so
+    e visto pelo "recarregar tudo" do fim. Leituras podem continuar.
+    reconstruir_indices=True apaga os indices de carros antes e recria depois (mais rapido
+    que manter os indices linha a linha quando a tabela cresce muito).
+    """
+    engine = engine or engine_padrao
+    migrar_banco(engine)
+    indices = list(Veiculos.__table__.indexes) if reconstruir_indices else []
+    # reindexar carros_busca e recontar carros_facetas no fim sai mais barato que linha a linha
+    adiar_derivadas = massa or reconstruir_indices
+    gatilhos_derivadas = {**GATILHOS_BUSCA, **GATILHOS_FACETAS}
+
+    with engine.connect() as conn:
+        anteriores = _aplicar_pragmas(conn, PRAGMAS_CARGA) if massa else {}
+        conn.commit()
+        try:
+            if massa:
+                for nome in GATILHOS:
+                    conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {nome}")
+            if adiar_derivadas:
+                for nome in gatilhos_derivadas:
+                    conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {nome}")
+            for index in indices:
+                index.drop(bind=conn, checkfirst=True)
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            # sempre volta ao estado normal, mesmo se a carga falhar no meio
+            for index in indices:
+                index.create(bind=conn, checkfirst=True)
+            if adiar_derivadas:
+                reconstruir_busca_texto(conn)
+                reconstruir_facetas(conn)
+                for ddl in gatilhos_derivadas.values():
+                    conn.exec_driver_sql(ddl)
+            if indices:
+                conn.exec_driver_sql("ANALYZE carros")
+            if massa:
+                for ddl in GATILHOS.values():
+                    conn.exec_driver_sql(ddl)
+                conn.exec_driver_sql("INSERT INTO carros_alteracoes (carro_id) VALUES (NULL)")
+                conn.exec_driver_sql("UPDATE carros_versao SET versao = versao + 1 WHERE id = 1")
+            conn.commit()
+            if anteriores:
+                _aplicar_pragmas(conn, anteriores)
+                conn.commit()
+            if massa:
+                # devolve o WAL da carga ao arquivo principal, para as leituras nao passarem por ele
+                conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def alimentar_banco(quantidade=100, lote=10_000, engine=None, massa=False, reconstruir_indices=False):
+    """Insere `quantidade` carros ficticios com insert() do Core, `lote` linhas por executemany.
+
+    massa e reconstruir_indices: ver conexao_de_carga. Devolve quantas linhas foram inseridas.
+    """
+    logging.info(f"Inicicando alimentação do BD, com {quantidade} de veículos fictícicos")
+    inicio = time.perf_counter()
+    inseridos = 0
+
+    with conexao_de_carga(engine, massa=massa, reconstruir_indices=reconstruir_indices) as conn:
+        for linhas in em_lotes(gerar_veiculos(quantidade), lote):
+            conn.execute(insert(Veiculos), linhas)
+            inseridos += len(linhas)
+
+    duracao = time.perf_counter() - inicio
+    logging.info(
+        f"Inseridos {inseridos} ao BD em {duracao:.1f}s ({inseridos / max(duracao, 1e-9):,.0f} linhas/s)"
+    )
+    return inseridos
 
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO)  
-    alimentar_banco(quantidade=100)         
+    logging.basicConfig(level=logging.INFO, force=True)  # models ja loga ao ser importado
+
+    parser = argparse.ArgumentParser(description="Popula o inventario com carros ficticios")
+    parser.add_argument("-n", "--quantidade", type=int, default=100, help="quantos carros inserir")
+    parser.add_argument("--lote", type=int, default=10_000, help="linhas por executemany")
+    parser.add_argument("--banco", default=None, help="arquivo SQLite (padrao: inventario.db)")
+    parser.add_argument("--massa", action="store_true",
+                        help="carga em massa: pragmas de carga e sem gatilhos durante a insercao "
+                             "(ninguem mais pode escrever no banco enquanto isso)")
+    parser.add_argument("--reconstruir-indices", action="store_true",
+                        help="apaga os indices antes da carga e recria no fim")
+    args = parser.parse_args()
+
+    alvo = criar_engine(args.banco) if args.banco else None
+    alimentar_banco(
+        quantidade=args.quantidade, lote=args.lote, engine=alvo,
+        massa=args.massa, reconstruir_indices=args.reconstruir_indices,
+    )